@@ -1,15 +1,42 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request, Header, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, UpdateOne, DeleteOne, CursorType, ReturnDocument, monitoring
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, PyMongoError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Generic, List, Optional, Set, TypeVar, Union
 import uuid
+import secrets
+import asyncio
+import time
+import math
+import hashlib
+import hmac
+import cProfile
+import pstats
+import threading
+import fcntl
+import gzip
+import mmap
+import struct
+import tempfile
+from contextvars import ContextVar
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import csv
+import io
+import json
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
@@ -18,11 +45,290 @@ import base64
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics (Prometheus). With several workers set PROMETHEUS_MULTIPROC_DIR to a
+# shared, empty directory so /metrics aggregates every process.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served", ["method", "route"], multiprocess_mode="livesum")
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+MONGO_COMMAND_ERRORS = Counter("mongo_command_errors_total", "Failed MongoDB commands", ["collection", "command"])
+CACHE_REQUESTS = Counter("cache_requests_total", "In-process cache lookups", ["cache", "result"])
+PAYMENT_PROVIDER_LATENCY = Histogram(
+    "payment_provider_request_duration_seconds", "Payment provider call latency", ["provider", "operation", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+PAYMENT_CIRCUIT_STATE = Gauge(
+    "payment_circuit_state", "Payment provider circuit breaker (0 closed, 1 half open, 2 open)", ["provider"],
+    multiprocess_mode="livemax"
+)
+PAYMENT_CIRCUIT_EVENTS = Counter("payment_circuit_events_total", "Circuit breaker transitions and rejected calls", ["provider", "event"])
+PAYMENT_FAILOVERS = Counter("payment_failovers_total", "Card payments moved to the other provider", ["from_provider", "to_provider"])
+RATE_LIMIT_DECISIONS = Counter("rate_limit_decisions_total", "Rate limiter decisions", ["route", "result"])
+
+class ProfileSession:
+    """Per-request Mongo timings collected while an admin profiles a request"""
+
+    def __init__(self):
+        self.mongo_seconds = 0.0
+        self.mongo_commands = 0
+        self._lock = threading.Lock()
+
+    def add_mongo_time(self, seconds: float):
+        with self._lock:
+            self.mongo_seconds += seconds
+            self.mongo_commands += 1
+
+# Motor copies the context into its executor threads, so the listener sees this
+current_profile: ContextVar[Optional[ProfileSession]] = ContextVar('current_profile', default=None)
+
+# Route template ("GET /api/products/{product_id}") of the request being served
+current_route: ContextVar[str] = ContextVar('current_route', default="-")
+
+# Slow query log. Commands slower than SLOW_QUERY_MS are grouped by collection,
+# filter shape and route so repeated unindexed lookups stand out.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+SLOW_QUERY_RECENT = int(os.environ.get('SLOW_QUERY_RECENT', 200))
+SLOW_QUERY_MAX_SHAPES = int(os.environ.get('SLOW_QUERY_MAX_SHAPES', 1000))
+
+def query_shape(value):
+    """Replace literal values with "?" but keep field names and operators"""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(v) for v in value if isinstance(v, (dict, list, tuple))]
+        return shapes or "?"
+    return "?"
+
+def command_filter(command_name: str, command) -> Any:
+    if command_name == "find":
+        return command.get("filter", {})
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query", {})
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return statements[0].get("q", {})
+    if command_name == "aggregate":
+        return [stage for stage in command.get("pipeline", []) if "$match" in stage or "$lookup" in stage]
+    return None
+
+class SlowQueryLog:
+    """Recent slow commands plus per-shape totals, shared by the listener threads"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self.recent = deque(maxlen=SLOW_QUERY_RECENT)
+        self.shapes: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, collection: str, command_name: str, command, duration_ms: float, route: str, failed: bool = False):
+        shape = json.dumps(query_shape(command_filter(command_name, command)), sort_keys=True, default=str)
+        entry = {
+            "collection": collection,
+            "command": command_name,
+            "filter_shape": shape,
+            "duration_ms": round(duration_ms, 3),
+            "route": route,
+            "failed": failed,
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+        key = (collection, command_name, shape, route)
+        with self._lock:
+            self.recent.append(entry)
+            stats = self.shapes.get(key)
+            if stats is None and len(self.shapes) < SLOW_QUERY_MAX_SHAPES:
+                stats = self.shapes[key] = {
+                    "collection": collection, "command": command_name, "filter_shape": shape, "route": route,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0
+                }
+            if stats is not None:
+                stats["count"] += 1
+                stats["total_ms"] += duration_ms
+                stats["max_ms"] = max(stats["max_ms"], duration_ms)
+                stats["last_at"] = entry["at"]
+        logger.warning(f"Slow query {duration_ms:.1f}ms {collection}.{command_name} {shape} route={route}")
+
+    def stats(self, limit: int = 50) -> dict:
+        with self._lock:
+            shapes = [
+                {**s, "total_ms": round(s["total_ms"], 3), "max_ms": round(s["max_ms"], 3),
+                 "avg_ms": round(s["total_ms"] / s["count"], 3)}
+                for s in self.shapes.values()
+            ]
+            recent = list(self.recent)[-limit:]
+        shapes.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {"threshold_ms": self.threshold_ms, "shapes": shapes[:limit], "recent": recent[::-1]}
+
+    def reset(self):
+        with self._lock:
+            self.recent.clear()
+            self.shapes.clear()
+
+slow_query_log = SlowQueryLog()
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the Motor client sends, per collection"""
+
+    def __init__(self):
+        self._started: Dict[tuple, tuple] = {}
+
+    def started(self, event):
+        collection = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else "-"
+        # The command is only turned into a filter shape if it turns out slow
+        self._started[(event.connection_id, event.request_id)] = (collection, event.command, current_route.get())
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        collection = self._finished(event, failed=True)
+        MONGO_COMMAND_ERRORS.labels(collection, event.command_name).inc()
+
+    def _finished(self, event, failed: bool = False) -> str:
+        collection, command, route = self._started.pop((event.connection_id, event.request_id), ("-", {}, "-"))
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(seconds)
+        if seconds * 1000 >= slow_query_log.threshold_ms:
+            slow_query_log.record(collection, event.command_name, command, seconds * 1000, route, failed)
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_mongo_time(seconds)
+        return collection
+
+class MongoPoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server, for /healthz and /readyz"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, dict] = {}
+
+    def _pool(self, address) -> dict:
+        key = f"{address[0]}:{address[1]}"
+        if key not in self._pools:
+            self._pools[key] = {"open": 0, "checked_out": 0, "waiting": 0, "checkout_timeouts": 0, "checkout_errors": 0, "cleared": 0}
+        return self._pools[key]
+
+    def _add(self, event, field: str, delta: int = 1):
+        with self._lock:
+            self._pool(event.address)[field] += delta
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(event, "cleared")
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self._add(event, "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event, "open", -1)
+
+    def connection_check_out_started(self, event):
+        self._add(event, "waiting")
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] -= 1
+            pool["checkout_timeouts" if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT else "checkout_errors"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] -= 1
+            pool["checked_out"] += 1
+
+    def connection_checked_in(self, event):
+        self._add(event, "checked_out", -1)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self._pools.items()}
+
+mongo_pool_stats = MongoPoolStats()
+
+# Connection pool settings. Compressors need a server that supports them;
+# "zstd" and "snappy" also need the zstandard/python-snappy packages.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')  # e.g. "zstd,snappy,zlib"
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT', 2))
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+UPLOAD_DIR = Path("/app/uploads")
+
+# Public catalog reads (products, banners, videos, testimonials, approved
+# reviews) go through `catalog_db`, which may read from secondaries. Orders,
+# payments, admin reads and every write stay on `db` (primary).
+CATALOG_READ_PREFERENCE = os.environ.get('CATALOG_READ_PREFERENCE', 'primary')
+CATALOG_MAX_STALENESS = int(os.environ.get('CATALOG_MAX_STALENESS', 90))  # Seconds, MongoDB minimum is 90; -1 = no limit
+
+def catalog_read_preference():
+    modes = {
+        "primary": Primary,
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest,
+    }
+    if CATALOG_READ_PREFERENCE not in modes:
+        raise ValueError(f"Unknown CATALOG_READ_PREFERENCE: {CATALOG_READ_PREFERENCE}")
+    if CATALOG_READ_PREFERENCE == "primary":
+        return Primary()
+    return modes[CATALOG_READ_PREFERENCE](max_staleness=CATALOG_MAX_STALENESS)
+
+# Created in the lifespan so importing the app does no DNS/SRV lookups or
+# socket and monitor thread setup; scripts may call connect_mongo() directly.
+client: Optional[AsyncIOMotorClient] = None
+db = None
+catalog_db = None
+
+def connect_mongo():
+    global client, db, catalog_db
+    if client is None:
+        options = {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        }
+        if MONGO_COMPRESSORS:
+            options["compressors"] = MONGO_COMPRESSORS
+        client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), mongo_pool_stats], **options)
+        db = client[os.environ['DB_NAME']]
+        catalog_db = client.get_database(os.environ['DB_NAME'], read_preference=catalog_read_preference())
+    return db
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_mongo()
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    await start_background_services()
+    try:
+        yield
+    finally:
+        await shutdown_db_client()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -84,6 +390,7 @@ class Product(BaseModel):
     is_campaign: bool = False
     campaign_text: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
 
 class ProductCreate(BaseModel):
     name: str
@@ -113,6 +420,26 @@ class ProductUpdate(BaseModel):
     is_campaign: Optional[bool] = None
     campaign_text: Optional[str] = None
 
+class ProductBulkRow(ProductUpdate):
+    action: Optional[str] = None  # "create", "update", "delete" or empty (update if exists, else create)
+    id: Optional[str] = None
+
+class ProductBulkRowResult(BaseModel):
+    row: int
+    action: Optional[str] = None
+    id: Optional[str] = None
+    name: Optional[str] = None
+    status: str  # "created", "updated", "deleted", "not_found", "error", "skipped"
+    error: Optional[str] = None
+
+class ProductBulkResult(BaseModel):
+    total: int
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: List[ProductBulkRowResult]
+
 class Slide(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -181,6 +508,7 @@ class Banner(BaseModel):
     blog_content: Optional[str] = None
     blog_images: Optional[List[str]] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
 
 class BannerCreate(BaseModel):
     title: str
@@ -209,10 +537,62 @@ class OrderItem(BaseModel):
     price: float
     variant: Optional[str] = None
 
+# Order codes: HRB- plus random Crockford base32 symbols and a Luhn mod 32 check
+# symbol, so a mistyped code is rejected without a database read. A unique index
+# catches the rare collision and place_order draws again. Older codes are 6 hex digits.
+ORDER_CODE_PREFIX = "HRB-"
+ORDER_CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ORDER_CODE_LENGTH = int(os.environ.get('ORDER_CODE_LENGTH', 8))  # Random symbols, check symbol excluded
+ORDER_CODE_MAX_ATTEMPTS = 5
+LEGACY_ORDER_CODE_LENGTH = 6
+
+if ORDER_CODE_LENGTH < 1:
+    raise ValueError("ORDER_CODE_LENGTH must be a positive number")
+if ORDER_CODE_LENGTH + 1 == LEGACY_ORDER_CODE_LENGTH:
+    # The code would be as long as a legacy one and is_valid_order_code would read it as hex
+    raise ValueError(f"ORDER_CODE_LENGTH cannot be {ORDER_CODE_LENGTH}: codes would clash with legacy {LEGACY_ORDER_CODE_LENGTH}-symbol codes")
+
+def order_code_check(body: str) -> str:
+    base = len(ORDER_CODE_ALPHABET)
+    total = 0
+    for position, symbol in enumerate(reversed(body)):
+        value = ORDER_CODE_ALPHABET.index(symbol) * (2 if position % 2 == 0 else 1)
+        total += value // base + value % base
+    return ORDER_CODE_ALPHABET[-total % base]
+
+def new_order_code() -> str:
+    body = "".join(secrets.choice(ORDER_CODE_ALPHABET) for _ in range(ORDER_CODE_LENGTH))
+    return f"{ORDER_CODE_PREFIX}{body}{order_code_check(body)}"
+
+def normalize_order_code(code: str) -> str:
+    """Upper-case and fold the look-alikes customers type (O -> 0, I/L -> 1)"""
+    code = code.strip().upper()
+    if not code.startswith(ORDER_CODE_PREFIX):
+        return code
+    body = code[len(ORDER_CODE_PREFIX):].replace("O", "0").replace("I", "1").replace("L", "1")
+    return ORDER_CODE_PREFIX + body
+
+def is_valid_order_code(code: str) -> bool:
+    if not code.startswith(ORDER_CODE_PREFIX):
+        return False
+    body = code[len(ORDER_CODE_PREFIX):]
+    if len(body) == LEGACY_ORDER_CODE_LENGTH:
+        return all(c in "0123456789ABCDEF" for c in body)
+    if len(body) < 2 or any(c not in ORDER_CODE_ALPHABET for c in body):
+        return False
+    return order_code_check(body[:-1]) == body[-1]
+
+def order_lookup(key: str) -> Optional[dict]:
+    """Single-field query for an order id or order code; None for a code that cannot exist"""
+    code = normalize_order_code(key)
+    if code.startswith(ORDER_CODE_PREFIX):
+        return {"order_code": code} if is_valid_order_code(code) else None
+    return {"id": key.strip()}
+
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    order_code: str = Field(default_factory=lambda: f"HRB-{uuid.uuid4().hex[:6].upper()}")
+    order_code: str = Field(default_factory=new_order_code)
     customer_name: str
     customer_email: EmailStr
     customer_phone: str
@@ -221,7 +601,9 @@ class Order(BaseModel):
     items: List[OrderItem]
     total_amount: float
     status: str = "pending"
+    payment_status: Optional[str] = None  # Card payments: "paid" or "failed", set from the provider result
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
 
 class OrderCreate(BaseModel):
     customer_name: str
@@ -235,6 +617,24 @@ class OrderCreate(BaseModel):
 class OrderUpdate(BaseModel):
     status: str
 
+class OrderBulkStatusUpdate(BaseModel):
+    order_ids: List[str]  # Order ids or order codes
+    status: str
+
+class OrderBulkStatusRowResult(BaseModel):
+    order_id: str
+    id: Optional[str] = None
+    order_code: Optional[str] = None
+    previous_status: Optional[str] = None
+    status: str  # "updated", "unchanged", "not_found"
+
+class OrderBulkStatusResult(BaseModel):
+    status: str
+    updated: int = 0
+    unchanged: int = 0
+    not_found: int = 0
+    results: List[OrderBulkStatusRowResult]
+
 class Testimonial(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -319,6 +719,7 @@ class CardPaymentResponse(BaseModel):
     iframe_token: Optional[str] = None
     html_content: Optional[str] = None
     error_message: Optional[str] = None
+    provider: Optional[str] = None  # Differs from the requested one after a failover
 
 class SiteSettings(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -374,6 +775,7 @@ class ProductReview(BaseModel):
     image_url: Optional[str] = None
     approved: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
 
 class ProductReviewCreate(BaseModel):
     product_id: str
@@ -385,6 +787,606 @@ class ProductReviewCreate(BaseModel):
 class ProductReviewUpdate(BaseModel):
     approved: Optional[bool] = None
 
+class ProductRatingSummary(BaseModel):
+    count: int = 0
+    average: Optional[float] = None
+    distribution: Dict[str, int] = Field(default_factory=lambda: {str(star): 0 for star in range(1, 6)})
+
+class ProductDetail(BaseModel):
+    product: Product
+    rating: ProductRatingSummary
+    reviews: List[ProductReview]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page of reviews
+
+# Cache invalidation (shared across workers)
+CACHED_COLLECTIONS = ("products", "banners", "videos", "testimonials", "site_settings", "payment_settings", "product_reviews")
+CACHE_INVALIDATION_MODE = os.environ.get('CACHE_INVALIDATION_MODE', 'auto')  # "auto", "change_stream", "poll" or "off"
+CACHE_EVENTS_SIZE = int(os.environ.get('CACHE_EVENTS_SIZE', 1024 * 1024))
+
+class CacheInvalidator:
+    """Broadcasts writes to cached collections to every worker process.
+
+    On a replica set a single change stream watches the cached collections. On a
+    standalone server writers append to the capped `cache_events` collection and
+    every worker tails it.
+    """
+
+    def __init__(self, mode: str = "auto"):
+        self.mode = mode
+        self.active_mode: Optional[str] = None
+        self.worker_id = uuid.uuid4().hex
+        self.db = None
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, collection: str, callback: Callable[[str], None]):
+        """Register a callback run (in this worker) whenever `collection` changes"""
+        self._subscribers.setdefault(collection, []).append(callback)
+
+    def _dispatch(self, collection: Optional[str]):
+        collections = [collection] if collection else list(CACHED_COLLECTIONS)
+        for name in collections:
+            for callback in self._subscribers.get(name, []):
+                try:
+                    callback(name)
+                except Exception as e:
+                    logger.error(f"Cache invalidation callback error for {name}: {str(e)}")
+
+    async def publish(self, collection: str):
+        """Invalidate `collection` in this worker and tell the others about it"""
+        self._dispatch(collection)
+        if self.active_mode != "poll":
+            return  # The change stream picks the write up by itself
+        try:
+            await self.db.cache_events.insert_one({
+                "collection": collection,
+                "worker": self.worker_id,
+                "created_at": datetime.now(timezone.utc)
+            })
+        except PyMongoError as e:
+            logger.error(f"Cache event publish error: {str(e)}")
+
+    async def start(self, database):
+        self.db = database
+        if self.mode == "off":
+            return
+        mode = self.mode
+        if mode == "auto":
+            mode = "change_stream" if await self._supports_change_streams() else "poll"
+        if mode == "poll":
+            self._task = asyncio.create_task(self._tail_cache_events())
+        else:
+            self._task = asyncio.create_task(self._watch_change_stream())
+        self.active_mode = mode
+        logger.info(f"Cache invalidation running in {mode} mode (worker {self.worker_id})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.active_mode = None
+
+    async def _supports_change_streams(self) -> bool:
+        try:
+            hello = await self.db.client.admin.command("hello")
+        except PyMongoError:
+            return False
+        return 'setName' in hello or hello.get('msg') == 'isdbgrid'
+
+    async def _ensure_events_collection(self):
+        try:
+            await self.db.create_collection("cache_events", capped=True, size=CACHE_EVENTS_SIZE)
+            # A tailable cursor on an empty capped collection dies at once, so seed it
+            await self.db.cache_events.insert_one({"collection": None, "worker": self.worker_id, "created_at": datetime.now(timezone.utc)})
+        except CollectionInvalid:
+            pass  # Created by another worker
+
+    async def _watch_change_stream(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(CACHED_COLLECTIONS)}}}]
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    async for change in stream:
+                        self._dispatch(change.get('ns', {}).get('coll'))
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Cache change stream interrupted: {str(e)}")
+            # Events may have been missed while the stream was down
+            self._dispatch(None)
+            await asyncio.sleep(1)
+
+    async def _tail_cache_events(self):
+        ensured = False
+        while True:
+            try:
+                if not ensured:
+                    # Here rather than in start() so a worker booting without Mongo keeps retrying
+                    await self._ensure_events_collection()
+                    ensured = True
+                latest = await self.db.cache_events.find_one({}, sort=[("$natural", -1)])
+                query = {"_id": {"$gt": latest['_id']}} if latest else {}
+                cursor = self.db.cache_events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        if event.get('worker') != self.worker_id and event.get('collection'):
+                            self._dispatch(event['collection'])
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Cache event tailing interrupted: {str(e)}")
+            self._dispatch(None)
+            await asyncio.sleep(1)
+
+cache_invalidator = CacheInvalidator(CACHE_INVALIDATION_MODE)
+
+# Live events (payment status, admin order feed). Publishers append to the capped
+# `live_events` collection; every worker tails it and fans each event out to its
+# own SSE/WebSocket listeners, so a callback handled by one worker reaches a
+# browser connected to another.
+LIVE_EVENTS_SIZE = int(os.environ.get('LIVE_EVENTS_SIZE', 4 * 1024 * 1024))
+LIVE_EVENTS_QUEUE_SIZE = int(os.environ.get('LIVE_EVENTS_QUEUE_SIZE', 100))
+
+class LiveEventBus:
+    """Topic based fan-out of small JSON events across workers"""
+
+    def __init__(self):
+        self.db = None
+        self._subscribers: Dict[str, set] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=LIVE_EVENTS_QUEUE_SIZE)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(topic)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[topic]
+
+    def listeners(self, topic: str) -> int:
+        return len(self._subscribers.get(topic, ()))
+
+    def _dispatch(self, topic: str, data: dict):
+        for queue in list(self._subscribers.get(topic, ())):
+            if queue.full():
+                queue.get_nowait()  # A slow listener loses the oldest event, not the newest
+            queue.put_nowait(data)
+
+    async def publish(self, topic: str, data: dict):
+        if self._task is None:
+            self._dispatch(topic, data)  # Not tailing (single process/tests): deliver locally
+            return
+        try:
+            await self.db.live_events.insert_one({"topic": topic, "data": data, "created_at": datetime.now(timezone.utc)})
+        except PyMongoError as e:
+            logger.error(f"Live event publish error: {str(e)}")
+            self._dispatch(topic, data)
+
+    async def start(self, database):
+        self.db = database
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _ensure_collection(self):
+        try:
+            await self.db.create_collection("live_events", capped=True, size=LIVE_EVENTS_SIZE)
+            # A tailable cursor on an empty capped collection dies at once, so seed it
+            await self.db.live_events.insert_one({"topic": None, "created_at": datetime.now(timezone.utc)})
+        except CollectionInvalid:
+            pass  # Created by another worker
+
+    async def _tail(self):
+        latest = None
+        ensured = False
+        while True:
+            try:
+                if not ensured:
+                    # Retried here so a worker booting without Mongo still comes up
+                    await self._ensure_collection()
+                    ensured = True
+                if latest is None:
+                    latest = await self.db.live_events.find_one({}, sort=[("$natural", -1)])
+                query = {"_id": {"$gt": latest['_id']}} if latest else {}
+                cursor = self.db.live_events.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        latest = event
+                        if event.get('topic'):
+                            self._dispatch(event['topic'], event.get('data') or {})
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Live event tailing interrupted: {str(e)}")
+            await asyncio.sleep(1)
+
+live_events = LiveEventBus()
+
+async def publish_order_event(event_type: str, **data):
+    """Send a small delta to the live admin order feed"""
+    await live_events.publish("orders", {"type": event_type, **data, "at": datetime.now(timezone.utc).isoformat()})
+
+def sse_message(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode('utf-8')
+
+# Settings cache (site_settings and payment_settings singletons)
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', 300))
+
+def default_settings(name: str) -> BaseModel:
+    if name == "payment_settings":
+        return PaymentSettings(
+            account_holder_name="Herbalife Türkiye",
+            iban="TR00 0000 0000 0000 0000 0000 00",
+            bank_name="Banka Adı"
+        )
+    return SiteSettings()
+
+class SettingsService:
+    """Keeps the site and payment settings singletons in memory.
+
+    Both documents are seeded and loaded by a background task at startup,
+    refreshed before they expire, replaced by the PUT handlers and reloaded when
+    another worker changes them, so request handlers only query them if they
+    arrive before the first load. Past the TTL (the refresh keeps failing) reads
+    get the stale copy while a retry runs in the background.
+    """
+
+    NAMES = ("site_settings", "payment_settings")
+
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self.db = None
+        self._values: Dict[str, dict] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._locks = {name: asyncio.Lock() for name in self.NAMES}
+        self._retrying: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, database):
+        self.db = database
+        for name in self.NAMES:
+            cache_invalidator.subscribe(name, self._on_invalidate)
+        # Seeding waits on Mongo; keep it off the startup path
+        self._task = asyncio.create_task(self._refresh_ahead())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def get(self, name: str) -> dict:
+        """Return a copy of the cached settings document"""
+        loaded_at = self._loaded_at.get(name)
+        if loaded_at is None:
+            # Nothing to fall back on yet, so this read waits (and fails) with Mongo
+            CACHE_REQUESTS.labels(name, "miss").inc()
+            async with self._locks[name]:
+                if name not in self._values:
+                    await self.refresh(name)
+        elif time.monotonic() - loaded_at > self.ttl:
+            # Only reached if the background refresh has stalled, e.g. during a
+            # Mongo outage: serve the stale copy and retry off the request path
+            CACHE_REQUESTS.labels(name, "stale").inc()
+            if name not in self._retrying:
+                self._retrying.add(name)
+                asyncio.get_running_loop().create_task(self._retry_stale(name))
+        else:
+            CACHE_REQUESTS.labels(name, "hit").inc()
+        return dict(self._values[name])
+
+    def set(self, name: str, doc: dict):
+        """Replace the cached document after a write in this worker"""
+        value = dict(doc)
+        value.pop('_id', None)
+        if isinstance(value.get('updated_at'), str):
+            value['updated_at'] = datetime.fromisoformat(value['updated_at'])
+        self._values[name] = value
+        self._loaded_at[name] = time.monotonic()
+
+    async def refresh(self, name: str):
+        doc = await self.db[name].find_one({"id": name}, {"_id": 0})
+        self.set(name, doc or default_settings(name).model_dump())
+
+    async def _seed(self, name: str):
+        """Insert the default document once instead of on a read"""
+        doc = default_settings(name).model_dump()
+        doc['updated_at'] = doc['updated_at'].isoformat()
+        try:
+            await self.db[name].create_index("id", unique=True)
+        except PyMongoError as e:
+            logger.warning(f"Could not create unique index on {name}.id: {str(e)}")
+        try:
+            await self.db[name].update_one({"id": name}, {"$setOnInsert": doc}, upsert=True)
+        except PyMongoError as e:
+            logger.warning(f"Could not seed {name}: {str(e)}")
+
+    def _on_invalidate(self, name: str):
+        asyncio.get_running_loop().create_task(self._safe_refresh(name))
+
+    async def _safe_refresh(self, name: str):
+        try:
+            await self.refresh(name)
+        except PyMongoError as e:
+            logger.error(f"Settings refresh error for {name}: {str(e)}")
+
+    async def _retry_stale(self, name: str):
+        try:
+            async with self._locks[name]:
+                if time.monotonic() - self._loaded_at[name] > self.ttl:
+                    await self.refresh(name)
+        except PyMongoError as e:
+            logger.warning(f"Serving stale {name}, refresh failed: {str(e)}")
+        finally:
+            self._retrying.discard(name)
+
+    async def _refresh_ahead(self):
+        for name in self.NAMES:
+            await self._seed(name)
+            await self._safe_refresh(name)  # Without Mongo, get() and the loop below retry
+        while True:
+            # Retry soon while a document has never loaded, e.g. Mongo was down at boot
+            loaded = all(name in self._values for name in self.NAMES)
+            await asyncio.sleep(self.ttl * 0.8 if loaded else 5)
+            for name in self.NAMES:
+                await self._safe_refresh(name)
+
+settings_service = SettingsService()
+
+# Catalog snapshot (shared across workers). The encoded public catalog lists are
+# written to one versioned file per build and mmapped by every worker, so the
+# page cache holds a single copy however many workers run.
+CATALOG_SNAPSHOT_ENABLED = os.environ.get('CATALOG_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+CATALOG_SNAPSHOT_DIR = Path(os.environ.get(
+    'CATALOG_SNAPSHOT_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f"herbalife-catalog-{os.environ.get('DB_NAME', 'default')}")
+))
+CATALOG_SNAPSHOT_TTL = float(os.environ.get('CATALOG_SNAPSHOT_TTL', 300))
+CATALOG_SNAPSHOT_COLLECTIONS = ("products", "banners", "videos", "testimonials")
+# Quality 11 costs seconds per build for a few percent over 5
+CATALOG_BROTLI_QUALITY = int(os.environ.get('CATALOG_BROTLI_QUALITY', 5))
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip copies are stored
+    brotli = None
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """Content codings the client accepts (q > 0), best first"""
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.strip()
+        q = params[2:] if params.startswith("q=") else "1"
+        try:
+            if float(q) > 0:
+                accepted.add(coding.strip())
+        except ValueError:
+            continue
+    return [coding for coding in ("br", "gzip") if coding in accepted or "*" in accepted]
+
+class CatalogSnapshot:
+    """Serves the public catalog lists from a memory-mapped snapshot file.
+
+    File layout: an 8 byte header length, a JSON header with the build time and
+    the (offset, length) of every section and content coding relative to the
+    end of the header, then the response bodies: JSON plus precompressed gzip
+    and brotli copies, so a hit is a lookup and a write.
+    Builds write `catalog-<version>.snap` and atomically replace the `current`
+    pointer; a file lock makes sure only one worker builds at a time and the
+    others map the result. After an invalidation this worker falls back to
+    Mongo until it has mapped a snapshot started after the event.
+    """
+
+    HEADER = struct.Struct("<Q")
+    FORMAT = 2
+
+    def __init__(self, directory: Path = CATALOG_SNAPSHOT_DIR, ttl: float = CATALOG_SNAPSHOT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self.db = None
+        self.version: Optional[str] = None
+        self.started_at = 0.0
+        self._mm: Optional[mmap.mmap] = None
+        self._sections: Dict[str, List[int]] = {}
+        self._dirty_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def sections(self) -> Dict[str, tuple]:
+        """Snapshot key -> (response type adapter, loader)"""
+        return {
+            "products": (TypeAdapter(List[Product]), lambda: load_products(self.db)),
+            "products?is_package=true": (TypeAdapter(List[Product]), lambda: load_products(self.db, True)),
+            "products?is_package=false": (TypeAdapter(List[Product]), lambda: load_products(self.db, False)),
+            "banners": (TypeAdapter(List[Banner]), lambda: load_banners(self.db)),
+            "videos": (TypeAdapter(List[Video]), lambda: load_videos(self.db)),
+            "testimonials": (TypeAdapter(List[Testimonial]), lambda: load_testimonials(self.db)),
+        }
+
+    async def start(self, database):
+        if not CATALOG_SNAPSHOT_ENABLED:
+            return
+        # Builds read the primary so a stale secondary never ends up in the file
+        self.db = database
+        for name in CATALOG_SNAPSHOT_COLLECTIONS:
+            cache_invalidator.subscribe(name, self._on_invalidate)
+        self._dirty_at = time.time() - self.ttl  # Reuse a sibling's recent build
+        self._schedule()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._unmap()
+
+    def body(self, key: str, encodings: List[str] = ()) -> Optional[tuple]:
+        """(content coding, bytes) for the first of `encodings` stored, else identity.
+
+        The body is copied out of the map: ASGI wants bytes, and a memoryview
+        would stop _unmap from closing the map while a response still holds it.
+        Only that per-response copy is private; the resident catalog is shared.
+        """
+        if self._mm is None or self._dirty_at is not None:
+            CACHE_REQUESTS.labels("catalog_snapshot", "miss").inc()
+            return None
+        if time.time() - self.started_at > self.ttl:
+            self._dirty_at = time.time() - self.ttl
+            self._schedule()  # Serve this one; Mongo serves the rest until the rebuild is mapped
+        stored = self._sections[key]
+        coding = next((c for c in encodings if c in stored), "identity")
+        offset, length = stored[coding]
+        CACHE_REQUESTS.labels("catalog_snapshot", "hit").inc()
+        return coding, self._mm[offset:offset + length]
+
+    def response(self, key: str, request: Request) -> Optional[Response]:
+        encodings = accepted_encodings(request.headers.get("accept-encoding"))
+        etag = f'"{self.version}-{key}"'
+        if self._mm is not None and self._dirty_at is None and request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+        found = self.body(key, encodings)
+        if found is None:
+            return None
+        coding, body = found
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def encode(body: bytes) -> Dict[str, bytes]:
+        """The JSON body plus the compressed copies that are actually smaller"""
+        copies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            copies["br"] = brotli.compress(body, quality=CATALOG_BROTLI_QUALITY)
+        return {coding: data for coding, data in copies.items() if coding == "identity" or len(data) < len(body)}
+
+    def _on_invalidate(self, name: str):
+        self._dirty_at = time.time()
+        self._schedule()
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_until_clean())
+
+    async def _refresh_until_clean(self):
+        while self._dirty_at is not None:
+            not_before = self._dirty_at
+            try:
+                await self.refresh(not_before)
+            except (PyMongoError, OSError, ValueError) as e:
+                logger.error(f"Catalog snapshot refresh error: {str(e)}")
+                await asyncio.sleep(5)
+                continue
+            if self._dirty_at == not_before:
+                self._dirty_at = None
+
+    async def refresh(self, not_before: float):
+        """Map a snapshot whose build started at or after `not_before`, building one if needed"""
+        async with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.directory / "lock", "w")
+            try:
+                await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+                current = self._read_pointer()
+                if current is None or current[1] < not_before:
+                    current = await self._build()
+                if current[0] != self.version:
+                    self._map(*current)
+            finally:
+                lock_file.close()  # Releases the flock
+
+    def _read_pointer(self) -> Optional[tuple]:
+        try:
+            version, started_at, file_format = (self.directory / "current").read_text().split()
+        except (OSError, ValueError):
+            return None
+        if int(file_format) != self.FORMAT:
+            return None
+        if not (self.directory / f"catalog-{version}.snap").exists():
+            return None
+        return version, float(started_at)
+
+    async def _build(self) -> tuple:
+        started_at = time.time()
+        version = f"{time.time_ns():x}"
+        bodies, sections, offset = [], {}, 0
+        for key, (adapter, loader) in self.sections().items():
+            sections[key] = {}
+            documents = await loader()
+            # Validation, serialization and compression are CPU bound; keep them off the event loop
+            encoded = await asyncio.to_thread(lambda: self.encode(adapter.dump_json(adapter.validate_python(documents))))
+            for coding, body in encoded.items():
+                sections[key][coding] = [offset, len(body)]
+                bodies.append(body)
+                offset += len(body)
+        header = json.dumps({"version": version, "started_at": started_at, "sections": sections}).encode()
+
+        path = self.directory / f"catalog-{version}.snap"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(len(header)))
+            f.write(header)
+            for body in bodies:
+                f.write(body)
+        os.replace(tmp, path)
+        pointer = self.directory / "current.tmp"
+        pointer.write_text(f"{version} {started_at} {self.FORMAT}")
+        os.replace(pointer, self.directory / "current")
+
+        # Workers that still map an old file keep their mapping after the unlink
+        for old in self.directory.glob("catalog-*.snap"):
+            if old != path:
+                old.unlink(missing_ok=True)
+        logger.info(f"Catalog snapshot {version} built ({offset} bytes)")
+        return version, started_at
+
+    def _map(self, version: str, started_at: float):
+        with open(self.directory / f"catalog-{version}.snap", "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (header_length,) = self.HEADER.unpack_from(mm, 0)
+        base = self.HEADER.size + header_length
+        header = json.loads(mm[self.HEADER.size:base])
+        self._unmap()
+        self._mm = mm
+        self._sections = {
+            key: {coding: [base + offset, length] for coding, (offset, length) in codings.items()}
+            for key, codings in header["sections"].items()
+        }
+        self.version, self.started_at = version, started_at
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+            self.version = None
+
+catalog_snapshot = CatalogSnapshot()
+
 # Auth helpers
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -424,6 +1426,208 @@ async def require_super_admin(admin: dict = Depends(get_current_admin)):
         raise HTTPException(status_code=403, detail="Bu işlem için Yönetici yetkisi gereklidir")
     return admin
 
+# Rate limiting for public write endpoints
+# Per-route token buckets: `rate` tokens per `per` seconds, bursts up to `burst`.
+# Override some or all fields with RATE_LIMITS='{"create_order": {"rate": 20}}'
+DEFAULT_RATE_LIMITS = {
+    "create_order": {"rate": 10, "per": 60, "burst": 5},
+    "create_review": {"rate": 5, "per": 60, "burst": 3},
+    "upload": {"rate": 10, "per": 60, "burst": 5},
+    "card_payment_init": {"rate": 10, "per": 60, "burst": 5},
+}
+
+def load_rate_limits(overrides: str) -> Dict[str, dict]:
+    """Merge a RATE_LIMITS JSON override into the defaults field by field; bad values fail at startup"""
+    limits = {name: dict(limit) for name, limit in DEFAULT_RATE_LIMITS.items()}
+    parsed = json.loads(overrides or '{}')
+    if not isinstance(parsed, dict):
+        raise ValueError("RATE_LIMITS must be a JSON object")
+    for name, override in parsed.items():
+        if name not in limits:
+            raise ValueError(f"Unknown rate limit route in RATE_LIMITS: {name}")
+        if not isinstance(override, dict):
+            raise ValueError(f"RATE_LIMITS[{name}] must be an object")
+        for key, value in override.items():
+            if key not in ("rate", "per", "burst"):
+                raise ValueError(f"Unknown field in RATE_LIMITS[{name}]: {key}")
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"RATE_LIMITS[{name}][{key}] must be a positive number")
+            limits[name][key] = value
+    return limits
+
+RATE_LIMITS = load_rate_limits(os.environ.get('RATE_LIMITS', '{}'))
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+FORWARDED_PROXY_HOPS = int(os.environ.get('FORWARDED_PROXY_HOPS', 1))
+
+def client_ip(request: Request) -> str:
+    """Client address as seen by the outermost trusted proxy"""
+    forwarded = request.headers.get('x-forwarded-for')
+    if forwarded and FORWARDED_PROXY_HOPS > 0:
+        hops = [h.strip() for h in forwarded.split(',') if h.strip()]
+        if hops:
+            return hops[-min(FORWARDED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+class TokenBucketLimiter:
+    """In-process token buckets keyed by (route, client ip)"""
+
+    def __init__(self, limits: Dict[str, dict], max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.limits = limits
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()  # key -> [tokens, updated_at]
+        self.allowed: Dict[str, int] = {name: 0 for name in limits}
+        self.limited: Dict[str, int] = {name: 0 for name in limits}
+
+    def acquire(self, route: str, ip: str) -> float:
+        """Take a token; returns 0 when allowed, otherwise seconds until one is available"""
+        limit = self.limits[route]
+        refill = limit['rate'] / limit['per']
+        now = time.monotonic()
+        key = (route, ip)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(limit['burst']), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit['burst'], bucket[0] + (now - bucket[1]) * refill)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed[route] = self.allowed.get(route, 0) + 1
+            RATE_LIMIT_DECISIONS.labels(route, "allowed").inc()
+            return 0
+        self.limited[route] = self.limited.get(route, 0) + 1
+        RATE_LIMIT_DECISIONS.labels(route, "limited").inc()
+        return (1 - bucket[0]) / refill
+
+    def stats(self) -> dict:
+        return {
+            "tracked_clients": len(self._buckets),
+            "routes": {
+                name: {**limit, "allowed": self.allowed.get(name, 0), "limited": self.limited.get(name, 0)}
+                for name, limit in self.limits.items()
+            }
+        }
+
+rate_limiter = TokenBucketLimiter(RATE_LIMITS)
+
+def rate_limit(route: str):
+    """Dependency that rejects a client with 429 once its bucket for `route` is empty"""
+    async def check(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        retry_after = rate_limiter.acquire(route, client_ip(request))
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Çok fazla istek gönderildi, lütfen biraz sonra tekrar deneyin",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    return check
+
+# Idempotency keys for order creation and payment initialization
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 35))
+# An in-progress key older than this is treated as abandoned (e.g. the worker died)
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+# Fingerprints are keyed HMACs over the request without card data, so the stored
+# value cannot be brute-forced back to a card number or CVC
+IDEMPOTENCY_SECRET = os.environ.get('IDEMPOTENCY_SECRET') or JWT_SECRET
+IDEMPOTENCY_EXCLUDED_FIELDS = {"card_holder_name", "card_number", "expire_month", "expire_year", "cvc"}
+
+_idempotency_inflight: Dict[str, asyncio.Event] = {}
+
+def idempotency_fingerprint(payload: BaseModel) -> str:
+    body = payload.model_dump_json(exclude=IDEMPOTENCY_EXCLUDED_FIELDS)
+    return hmac.new(IDEMPOTENCY_SECRET.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+async def _wait_for_idempotent_result(doc_id: str) -> Optional[dict]:
+    """Wait for the in-flight request holding `doc_id`; None means the caller should run it"""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        event = _idempotency_inflight.get(doc_id)
+        remaining = deadline - time.monotonic()
+        if event is not None and remaining > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        stored = await db.idempotency_keys.find_one({"_id": doc_id})
+        if stored is None or stored['status'] == "done":
+            return stored
+        if time.monotonic() >= deadline:
+            break
+        if event is None:
+            await asyncio.sleep(0.2)  # Held by another worker
+
+    started = stored['created_at'].replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - started > timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT):
+        await db.idempotency_keys.delete_one({"_id": doc_id, "status": "in_progress", "created_at": stored['created_at']})
+        return None
+    raise HTTPException(status_code=409, detail="Aynı istek hâlâ işleniyor, lütfen tekrar deneyin")
+
+async def run_idempotent(
+    scope: str,
+    key: Optional[str],
+    payload: BaseModel,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = 200,
+    should_store: Callable[[Any], bool] = lambda result: True
+):
+    """Run `handler` once per Idempotency-Key and replay its stored response on retries"""
+    if not key:
+        return await handler()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+    doc_id = f"{scope}:{key}"
+    fingerprint = idempotency_fingerprint(payload)
+    while True:
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": doc_id,
+                "status": "in_progress",
+                "fingerprint": fingerprint,
+                "created_at": datetime.now(timezone.utc)
+            })
+            break
+        except DuplicateKeyError:
+            existing = await db.idempotency_keys.find_one({"_id": doc_id}, {"fingerprint": 1})
+            if existing and existing['fingerprint'] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            stored = await _wait_for_idempotent_result(doc_id)
+            if stored is not None:
+                return JSONResponse(
+                    content=stored['response'],
+                    status_code=stored['status_code'],
+                    headers={"Idempotent-Replayed": "true"}
+                )
+
+    event = asyncio.Event()
+    _idempotency_inflight[doc_id] = event
+    try:
+        result = await handler()
+        if should_store(result):
+            await db.idempotency_keys.update_one(
+                {"_id": doc_id},
+                {"$set": {"status": "done", "status_code": status_code, "response": jsonable_encoder(result)}}
+            )
+        else:
+            await db.idempotency_keys.delete_one({"_id": doc_id})
+        return result
+    except Exception:
+        await db.idempotency_keys.delete_one({"_id": doc_id})
+        raise
+    finally:
+        _idempotency_inflight.pop(doc_id, None)
+        event.set()
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register_admin(input: AdminCreate):
@@ -529,11 +1733,130 @@ async def delete_admin_user(admin_id: str, admin: dict = Depends(require_super_a
         raise HTTPException(status_code=404, detail="Kullanıcı bulunamadı")
     return {"message": "Kullanıcı silindi"}
 
+# Rate limit stats (admin)
+@api_router.get("/rate-limits")
+async def get_rate_limit_stats(admin: dict = Depends(get_current_admin)):
+    return {"enabled": RATE_LIMIT_ENABLED, **rate_limiter.stats()}
+
+# Slow query stats (admin). Counters are per worker and reset on restart.
+@api_router.get("/slow-queries")
+async def get_slow_queries(limit: int = 50, admin: dict = Depends(get_current_admin)):
+    return slow_query_log.stats(max(1, min(limit, SLOW_QUERY_RECENT)))
+
+@api_router.delete("/slow-queries")
+async def reset_slow_queries(admin: dict = Depends(require_super_admin)):
+    slow_query_log.reset()
+    return {"message": "Yavaş sorgu kayıtları temizlendi"}
+
+# Delta sync. Every write to these collections stamps updated_at and every delete
+# leaves a tombstone, so list endpoints can answer `?since=<cursor>` with only what
+# changed. `since=0` starts a full sync; cursors older than the tombstone retention
+# get 410 and must start over.
+SYNC_COLLECTIONS = ("products", "orders", "banners", "product_reviews")
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_TOMBSTONE_RETENTION = int(os.environ.get('SYNC_TOMBSTONE_RETENTION', 30 * 24 * 60 * 60))
+# Writes stamped less than this long ago may still be in flight on another worker;
+# they are left for the next call so a cursor never skips past them
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+
+SyncModel = TypeVar("SyncModel", bound=BaseModel)
+
+class SyncPage(BaseModel, Generic[SyncModel]):
+    """A ?since= page; list routes declare Union[List[Model], SyncPage[Model]]"""
+    changes: List[SyncModel]
+    deleted: List[str]
+    next_cursor: str
+    has_more: bool
+
+def sync_timestamp(moment: Optional[datetime] = None) -> str:
+    """Fixed-width UTC ISO string, so string order is time order"""
+    return (moment or datetime.now(timezone.utc)).isoformat(timespec="microseconds")
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(values)
+
+async def record_tombstones(collection: str, ids: List[str]):
+    if ids:
+        deleted_at = sync_timestamp()
+        now = datetime.now(timezone.utc)
+        await db.tombstones.insert_many([
+            {"collection": collection, "id": i, "deleted_at": deleted_at, "created_at": now} for i in ids
+        ])
+
+def after_cursor(field: str, stamp: str, last_id: str, until: str) -> dict:
+    return {"$and": [
+        {"$or": [{field: {"$gt": stamp}}, {field: stamp, "id": {"$gt": last_id}}]},
+        {field: {"$lte": until}}
+    ]}
+
+async def sync_page(collection: str, since: str, model: type, visible: Optional[Callable[[dict], bool]] = None) -> JSONResponse:
+    """Changes and deletions after `since`, oldest first.
+
+    Documents that no longer pass `visible` (e.g. a banner switched off) are
+    reported as deleted, since they drop out of the plain listing too.
+    """
+    now = datetime.now(timezone.utc)
+    until = sync_timestamp(now - timedelta(seconds=SYNC_SETTLE_SECONDS))
+    initial = since == "0"
+    stamp, last_id = ("", "") if initial else decode_cursor(since, 2)
+    if not initial and stamp < sync_timestamp(now - timedelta(seconds=SYNC_TOMBSTONE_RETENTION)):
+        raise HTTPException(status_code=410, detail="Cursor expired, run a full sync with since=0")
+
+    changed = await db[collection].find(after_cursor("updated_at", stamp, last_id, until), {"_id": 0}) \
+        .sort([("updated_at", 1), ("id", 1)]).limit(SYNC_PAGE_SIZE + 1).to_list(SYNC_PAGE_SIZE + 1)
+    tombstones = [] if initial else await db.tombstones.find(
+        {"collection": collection, **after_cursor("deleted_at", stamp, last_id, until)},
+        {"_id": 0, "id": 1, "deleted_at": 1}
+    ).sort([("deleted_at", 1), ("id", 1)]).limit(SYNC_PAGE_SIZE + 1).to_list(SYNC_PAGE_SIZE + 1)
+
+    events = sorted(
+        [(d['updated_at'], d['id'], d) for d in changed] + [(t['deleted_at'], t['id'], None) for t in tombstones],
+        key=lambda e: (e[0], e[1])
+    )
+    has_more = len(events) > SYNC_PAGE_SIZE
+    events = events[:SYNC_PAGE_SIZE]
+
+    # Latest event per id wins, e.g. a product deleted and then recreated with the same id
+    latest: Dict[str, Optional[dict]] = {}
+    for _, doc_id, doc in events:
+        latest.pop(doc_id, None)
+        latest[doc_id] = doc if doc is None or visible is None or visible(doc) else None
+    changes = [d for d in latest.values() if d is not None]
+    deleted = [] if initial else [doc_id for doc_id, d in latest.items() if d is None]
+
+    if events:
+        next_cursor = encode_cursor([events[-1][0], events[-1][1]])
+    elif initial or until > stamp:
+        # Nothing changed up to `until`: move the cursor there, so a quiet collection
+        # is not sent back to a full sync once `since` outlives the tombstones
+        next_cursor = encode_cursor([until, ""])
+    else:
+        next_cursor = since
+    page = SyncPage[model](changes=changes, deleted=deleted, next_cursor=next_cursor, has_more=has_more)
+    return JSONResponse(page.model_dump(mode="json"))
+
 # Product Routes
-@api_router.get("/products", response_model=List[Product])
-async def get_products(is_package: Optional[bool] = None):
+@api_router.get("/products", response_model=Union[List[Product], SyncPage[Product]])
+async def get_products(request: Request, is_package: Optional[bool] = None, since: Optional[str] = None):
+    if since is not None:
+        visible = None if is_package is None else (lambda p: p.get('is_package', False) == is_package)
+        return await sync_page("products", since, Product, visible)
+    key = "products" if is_package is None else f"products?is_package={str(is_package).lower()}"
+    return catalog_snapshot.response(key, request) or await load_products(catalog_db, is_package)
+
+async def load_products(database, is_package: Optional[bool] = None) -> List[dict]:
     query = {} if is_package is None else {"is_package": is_package}
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
+    products = await database.products.find(query, {"_id": 0}).to_list(1000)
     for p in products:
         if isinstance(p.get('created_at'), str):
             p['created_at'] = datetime.fromisoformat(p['created_at'])
@@ -558,12 +1881,129 @@ async def get_product(product_id: str):
         product['created_at'] = datetime.fromisoformat(product['created_at'])
     return product
 
+# Product detail: product, rating summary and a page of approved reviews in one
+# aggregation. First pages are cached (encoded) until a product or review changes.
+PRODUCT_DETAIL_REVIEWS = int(os.environ.get('PRODUCT_DETAIL_REVIEWS', 10))
+PRODUCT_DETAIL_CACHE_TTL = float(os.environ.get('PRODUCT_DETAIL_CACHE_TTL', 300))
+PRODUCT_DETAIL_CACHE_SIZE = int(os.environ.get('PRODUCT_DETAIL_CACHE_SIZE', 1000))
+
+class ProductDetailCache:
+    """LRU of encoded first-page product details, cleared on product/review changes"""
+
+    def __init__(self, ttl: float = PRODUCT_DETAIL_CACHE_TTL, size: int = PRODUCT_DETAIL_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.generation = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, product_id: str) -> Optional[bytes]:
+        entry = self._entries.get(product_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            CACHE_REQUESTS.labels("product_detail", "miss").inc()
+            return None
+        self._entries.move_to_end(product_id)
+        CACHE_REQUESTS.labels("product_detail", "hit").inc()
+        return entry[1]
+
+    def put(self, product_id: str, body: bytes, generation: int):
+        if generation != self.generation:
+            return  # Invalidated while the aggregation ran
+        self._entries[product_id] = (time.monotonic(), body)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self, collection: Optional[str] = None):
+        self._entries.clear()
+        self.generation += 1
+
+product_detail_cache = ProductDetailCache()
+for _collection in ("products", "product_reviews"):
+    cache_invalidator.subscribe(_collection, product_detail_cache.clear)
+
+def encode_review_cursor(review: dict) -> str:
+    return encode_cursor([review['created_at'], review['id']])
+
+def decode_review_cursor(cursor: str) -> tuple:
+    return decode_cursor(cursor, 2)
+
+async def load_product_detail(product_id: str, limit: int, cursor: Optional[str] = None) -> Optional[dict]:
+    page_match = {}
+    if cursor:
+        created_at, review_id = decode_review_cursor(cursor)
+        page_match = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": review_id}}
+        ]}
+    pipeline = [
+        {"$match": {"id": product_id}},
+        {"$limit": 1},
+        {"$project": {"_id": 0}},
+        {"$lookup": {
+            "from": "product_reviews",
+            "let": {"product_id": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$product_id", "$$product_id"]}, "approved": True}},
+                {"$facet": {
+                    "ratings": [{"$group": {"_id": "$rating", "count": {"$sum": 1}}}],
+                    "page": [
+                        {"$match": page_match},
+                        {"$sort": {"created_at": -1, "id": -1}},
+                        {"$limit": limit + 1},
+                        {"$project": {"_id": 0}}
+                    ]
+                }}
+            ],
+            "as": "review_facets"
+        }}
+    ]
+    docs = await catalog_db.products.aggregate(pipeline).to_list(1)
+    if not docs:
+        return None
+    product = docs[0]
+    facets = (product.pop('review_facets') or [{}])[0]
+
+    rating = ProductRatingSummary()
+    total = 0
+    for group in facets.get('ratings', []):
+        if isinstance(group['_id'], int) and 1 <= group['_id'] <= 5:
+            rating.distribution[str(group['_id'])] += group['count']
+            rating.count += group['count']
+            total += group['_id'] * group['count']
+    if rating.count:
+        rating.average = round(total / rating.count, 2)
+
+    page = facets.get('page', [])
+    next_cursor = encode_review_cursor(page[limit - 1]) if len(page) > limit else None
+    return {"product": product, "rating": rating, "reviews": page[:limit], "next_cursor": next_cursor}
+
+@api_router.get("/products/{product_id}/detail", response_model=ProductDetail)
+async def get_product_detail(product_id: str, cursor: Optional[str] = None, limit: int = PRODUCT_DETAIL_REVIEWS):
+    limit = max(1, min(limit, 50))
+    cacheable = cursor is None and limit == PRODUCT_DETAIL_REVIEWS
+    if cacheable:
+        body = product_detail_cache.get(product_id)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+
+    generation = product_detail_cache.generation
+    detail = await load_product_detail(product_id, limit, cursor)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    body = ProductDetail.model_validate(detail).model_dump_json().encode('utf-8')
+    if cacheable:
+        product_detail_cache.put(product_id, body, generation)
+    return Response(content=body, media_type="application/json")
+
 @api_router.post("/products", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(input: ProductCreate, admin: dict = Depends(get_current_admin)):
     product = Product(**input.model_dump())
+    product.updated_at = product.created_at
     doc = product.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['updated_at'] = sync_timestamp(product.updated_at)
     await db.products.insert_one(doc)
+    await cache_invalidator.publish("products")
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -574,7 +2014,9 @@ async def update_product(product_id: str, input: ProductUpdate, admin: dict = De
     
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if update_data:
+        update_data['updated_at'] = sync_timestamp()
         await db.products.update_one({"id": product_id}, {"$set": update_data})
+        await cache_invalidator.publish("products")
     
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -586,12 +2028,170 @@ async def delete_product(product_id: str, admin: dict = Depends(get_current_admi
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await record_tombstones("products", [product_id])
+    await cache_invalidator.publish("products")
     return {"message": "Product deleted"}
 
+# Bulk Product Routes
+PRODUCT_BULK_MAX_ROWS = 5000
+
+def parse_product_bulk_csv(text: str) -> List[dict]:
+    """Parse a product CSV into row dicts; empty cells are treated as missing"""
+    rows = []
+    for raw in csv.DictReader(io.StringIO(text)):
+        row = {k.strip(): v.strip() for k, v in raw.items() if k and isinstance(v, str) and v.strip() != ''}
+        if 'variants' in row:
+            try:
+                row['variants'] = json.loads(row['variants'])
+            except ValueError:
+                pass  # Left as a string so the row fails validation with a clear error
+        rows.append(row)
+    return rows
+
+def describe_row_error(e: Exception) -> str:
+    """Flatten a validation error into a single line for per-row results"""
+    if isinstance(e, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+@api_router.post("/products/bulk", response_model=ProductBulkResult)
+async def bulk_products(request: Request, admin: dict = Depends(get_current_admin)):
+    """Apply product creates, updates and deletes from a JSON array or CSV in one ordered bulk_write"""
+    content_type = request.headers.get('content-type', '')
+    try:
+        if content_type.startswith('multipart/form-data'):
+            form = await request.form()
+            upload = form.get('file')
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="CSV file is required")
+            raw_rows = parse_product_bulk_csv((await upload.read()).decode('utf-8-sig'))
+        elif 'json' in content_type:
+            body = await request.json()
+            raw_rows = body.get('operations') if isinstance(body, dict) else body
+        else:
+            raw_rows = parse_product_bulk_csv((await request.body()).decode('utf-8-sig'))
+    except (ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Invalid bulk payload")
+
+    if not isinstance(raw_rows, list):
+        raise HTTPException(status_code=400, detail="Expected a list of product operations")
+    if len(raw_rows) > PRODUCT_BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BULK_MAX_ROWS} rows are allowed per request")
+
+    results: List[Optional[ProductBulkRowResult]] = [None] * len(raw_rows)
+    parsed = []
+    for i, raw in enumerate(raw_rows):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("Row must be an object")
+            row = ProductBulkRow(**raw)
+            if row.action is not None:
+                row.action = row.action.strip().lower() or None
+            if row.action not in (None, 'create', 'update', 'delete'):
+                raise ValueError(f"Unknown action: {row.action}")
+            if row.action != 'create' and not row.id and not row.name:
+                raise ValueError("id or name is required")
+        except (ValueError, TypeError) as e:
+            results[i] = ProductBulkRowResult(row=i + 1, status="error", error=describe_row_error(e))
+            continue
+        parsed.append((i, row))
+
+    # Resolve every id/name key with a single query
+    ids = [row.id for _, row in parsed if row.id]
+    names = [row.name for _, row in parsed if not row.id and row.name]
+    ids_by_name: Dict[str, List[str]] = {}
+    known_ids = set()
+    if ids or names:
+        existing = await db.products.find(
+            {"$or": [{"id": {"$in": ids}}, {"name": {"$in": names}}]},
+            {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
+        for p in existing:
+            known_ids.add(p['id'])
+            ids_by_name.setdefault(p.get('name'), []).append(p['id'])
+
+    ops = []
+    op_rows = []
+    for i, row in parsed:
+        product_id = row.id
+        if not product_id and row.name and row.action != 'create':
+            matches = ids_by_name.get(row.name, [])
+            if len(matches) > 1:
+                results[i] = ProductBulkRowResult(row=i + 1, action=row.action, name=row.name, status="error", error=f"{len(matches)} products share this name, use id instead")
+                continue
+            product_id = matches[0] if matches else None
+        exists = product_id in known_ids
+        action = row.action or ('update' if exists else 'create')
+        data = row.model_dump(exclude={'action', 'id'}, exclude_none=True)
+
+        if action == 'create':
+            if exists:
+                results[i] = ProductBulkRowResult(row=i + 1, action=action, id=product_id, name=row.name, status="error", error="Product already exists")
+                continue
+            try:
+                fields = ProductCreate(**data).model_dump()
+            except (ValueError, TypeError) as e:
+                results[i] = ProductBulkRowResult(row=i + 1, action=action, id=row.id, name=row.name, status="error", error=describe_row_error(e))
+                continue
+            product = Product(**fields, **({'id': row.id} if row.id else {}))
+            doc = product.model_dump()
+            doc['created_at'] = doc['created_at'].isoformat()
+            doc['updated_at'] = sync_timestamp(product.created_at)
+            ops.append(InsertOne(doc))
+            product_id = product.id
+            known_ids.add(product_id)
+            ids_by_name.setdefault(product.name, []).append(product_id)
+        elif not exists:
+            results[i] = ProductBulkRowResult(row=i + 1, action=action, id=product_id, name=row.name, status="not_found", error="Product not found")
+            continue
+        elif action == 'update':
+            if not data:
+                results[i] = ProductBulkRowResult(row=i + 1, action=action, id=product_id, name=row.name, status="skipped", error="Nothing to update")
+                continue
+            ops.append(UpdateOne({"id": product_id}, {"$set": {**data, "updated_at": sync_timestamp()}}))
+        else:
+            ops.append(DeleteOne({"id": product_id}))
+            known_ids.discard(product_id)
+
+        op_rows.append(i)
+        status_text = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}[action]
+        results[i] = ProductBulkRowResult(row=i + 1, action=action, id=product_id, name=row.name or data.get('name'), status=status_text)
+
+    if ops:
+        try:
+            await db.products.bulk_write(ops, ordered=True)
+        except BulkWriteError as e:
+            # Ordered writes stop at the first error; nothing after it was applied
+            write_errors = e.details.get('writeErrors', [])
+            failed_at = write_errors[0]['index'] if write_errors else 0
+            message = write_errors[0].get('errmsg', str(e)) if write_errors else str(e)
+            for op_index, i in enumerate(op_rows):
+                if op_index == failed_at:
+                    results[i].status = "error"
+                    results[i].error = message
+                elif op_index > failed_at:
+                    results[i].status = "skipped"
+                    results[i].error = "Not applied because an earlier row failed"
+        await record_tombstones("products", [results[i].id for i in op_rows if results[i].status == "deleted"])
+        await cache_invalidator.publish("products")
+
+    counts = {s: sum(1 for r in results if r.status == s) for s in ('created', 'updated', 'deleted')}
+    return ProductBulkResult(
+        total=len(results),
+        created=counts['created'],
+        updated=counts['updated'],
+        deleted=counts['deleted'],
+        failed=sum(1 for r in results if r.status in ('error', 'not_found')),
+        results=results
+    )
+
 # Video/Slider Routes (supports both video and image)
 @api_router.get("/videos", response_model=List[Video])
-async def get_videos():
-    videos = await db.videos.find({"active": True}, {"_id": 0}).sort("order", 1).to_list(1000)
+async def get_videos(request: Request):
+    return catalog_snapshot.response("videos", request) or await load_videos(catalog_db)
+
+async def load_videos(database) -> List[dict]:
+    videos = await database.videos.find({"active": True}, {"_id": 0}).sort("order", 1).to_list(1000)
     for v in videos:
         if isinstance(v.get('created_at'), str):
             v['created_at'] = datetime.fromisoformat(v['created_at'])
@@ -619,6 +2219,7 @@ async def create_video(input: VideoCreate, admin: dict = Depends(get_current_adm
     doc = video.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.videos.insert_one(doc)
+    await cache_invalidator.publish("videos")
     return video
 
 @api_router.put("/videos/{video_id}", response_model=Video)
@@ -630,6 +2231,7 @@ async def update_video(video_id: str, input: VideoUpdate, admin: dict = Depends(
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if update_data:
         await db.videos.update_one({"id": video_id}, {"$set": update_data})
+        await cache_invalidator.publish("videos")
     
     updated = await db.videos.find_one({"id": video_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -643,12 +2245,18 @@ async def delete_video(video_id: str, admin: dict = Depends(get_current_admin)):
     result = await db.videos.delete_one({"id": video_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Video not found")
+    await cache_invalidator.publish("videos")
     return {"message": "Video deleted"}
 
 # Banner Routes
-@api_router.get("/banners", response_model=List[Banner])
-async def get_banners():
-    banners = await db.banners.find({"active": True}, {"_id": 0}).to_list(1000)
+@api_router.get("/banners", response_model=Union[List[Banner], SyncPage[Banner]])
+async def get_banners(request: Request, since: Optional[str] = None):
+    if since is not None:
+        return await sync_page("banners", since, Banner, lambda b: b.get('active') is True)
+    return catalog_snapshot.response("banners", request) or await load_banners(catalog_db)
+
+async def load_banners(database) -> List[dict]:
+    banners = await database.banners.find({"active": True}, {"_id": 0}).to_list(1000)
     for b in banners:
         if isinstance(b.get('created_at'), str):
             b['created_at'] = datetime.fromisoformat(b['created_at'])
@@ -680,9 +2288,12 @@ async def get_banner(banner_id: str):
 @api_router.post("/banners", response_model=Banner, status_code=status.HTTP_201_CREATED)
 async def create_banner(input: BannerCreate, admin: dict = Depends(get_current_admin)):
     banner = Banner(**input.model_dump())
+    banner.updated_at = banner.created_at
     doc = banner.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['updated_at'] = sync_timestamp(banner.updated_at)
     await db.banners.insert_one(doc)
+    await cache_invalidator.publish("banners")
     return banner
 
 @api_router.put("/banners/{banner_id}", response_model=Banner)
@@ -693,7 +2304,9 @@ async def update_banner(banner_id: str, input: BannerUpdate, admin: dict = Depen
     
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if update_data:
+        update_data['updated_at'] = sync_timestamp()
         await db.banners.update_one({"id": banner_id}, {"$set": update_data})
+        await cache_invalidator.publish("banners")
     
     updated = await db.banners.find_one({"id": banner_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -705,47 +2318,124 @@ async def delete_banner(banner_id: str, admin: dict = Depends(get_current_admin)
     result = await db.banners.delete_one({"id": banner_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Banner not found")
+    await record_tombstones("banners", [banner_id])
+    await cache_invalidator.publish("banners")
     return {"message": "Banner deleted"}
 
 # Order Routes
-@api_router.post("/orders", response_model=Order, status_code=status.HTTP_201_CREATED)
-async def create_order(input: OrderCreate):
+@api_router.post("/orders", response_model=Order, status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("create_order"))])
+async def create_order(input: OrderCreate, idempotency_key: Optional[str] = Header(None)):
+    return await run_idempotent("create_order", idempotency_key, input, lambda: place_order(input), status_code=status.HTTP_201_CREATED)
+
+async def place_order(input: OrderCreate) -> Order:
     order = Order(**input.model_dump())
+    order.updated_at = order.created_at
     doc = order.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['updated_at'] = sync_timestamp(order.updated_at)
     doc['items'] = [item.model_dump() for item in order.items]
-    await db.orders.insert_one(doc)
+    for attempt in range(ORDER_CODE_MAX_ATTEMPTS):
+        try:
+            await db.orders.insert_one(doc)
+            break
+        except DuplicateKeyError as e:
+            if 'order_code' not in (e.details or {}).get('keyPattern', {}) or attempt == ORDER_CODE_MAX_ATTEMPTS - 1:
+                raise
+            logger.warning(f"Order code collision on {order.order_code}, drawing a new one")
+            order.order_code = new_order_code()
+            doc['order_code'] = order.order_code
+            doc.pop('_id', None)
+    await publish_order_event("order_created", order={
+        "id": order.id,
+        "order_code": order.order_code,
+        "customer_name": order.customer_name,
+        "customer_email": order.customer_email,
+        "customer_phone": order.customer_phone,
+        "total_amount": order.total_amount,
+        "item_count": len(order.items),
+        "status": order.status,
+        "created_at": doc['created_at']
+    })
     return order
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str):
-    order = await db.orders.find_one({
-        "$or": [
-            {"id": order_id},
-            {"order_code": order_id.upper()}
-        ]
-    }, {"_id": 0})
+    query = order_lookup(order_id)
+    order = await db.orders.find_one(query, {"_id": 0}) if query else None
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if isinstance(order.get('created_at'), str):
         order['created_at'] = datetime.fromisoformat(order['created_at'])
     return order
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_orders(admin: dict = Depends(get_current_admin)):
+@api_router.get("/orders", response_model=Union[List[Order], SyncPage[Order]])
+async def get_orders(since: Optional[str] = None, admin: dict = Depends(get_current_admin)):
+    if since is not None:
+        return await sync_page("orders", since, Order)
     orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     for o in orders:
         if isinstance(o.get('created_at'), str):
             o['created_at'] = datetime.fromisoformat(o['created_at'])
     return orders
 
+ORDER_BULK_MAX_IDS = 1000
+
+@api_router.post("/orders/bulk-status", response_model=OrderBulkStatusResult)
+async def bulk_update_order_status(input: OrderBulkStatusUpdate, admin: dict = Depends(get_current_admin)):
+    """Move many orders (by id or order code) to one status with a single update_many"""
+    if not input.order_ids:
+        raise HTTPException(status_code=400, detail="No orders given")
+    if len(input.order_ids) > ORDER_BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {ORDER_BULK_MAX_IDS} orders are allowed per request")
+
+    keys = list(dict.fromkeys(k.strip() for k in input.order_ids if k and k.strip()))
+    codes = [normalize_order_code(k) for k in keys]
+    orders = await db.orders.find(
+        {"$or": [{"id": {"$in": keys}}, {"order_code": {"$in": [c for c in codes if is_valid_order_code(c)]}}]},
+        {"_id": 0, "id": 1, "order_code": 1, "status": 1}
+    ).to_list(None)
+    by_id = {o['id']: o for o in orders}
+    by_code = {o.get('order_code'): o for o in orders}
+
+    results = []
+    to_update = []
+    for key in keys:
+        order = by_id.get(key) or by_code.get(normalize_order_code(key))
+        if not order:
+            results.append(OrderBulkStatusRowResult(order_id=key, status="not_found"))
+            continue
+        changed = order.get('status') != input.status
+        if changed and order['id'] not in to_update:
+            to_update.append(order['id'])
+        results.append(OrderBulkStatusRowResult(
+            order_id=key,
+            id=order['id'],
+            order_code=order.get('order_code'),
+            previous_status=order.get('status'),
+            status="updated" if changed else "unchanged"
+        ))
+
+    if to_update:
+        await db.orders.update_many({"id": {"$in": to_update}}, {"$set": {"status": input.status, "updated_at": sync_timestamp()}})
+        await publish_order_event("order_status_changed", ids=to_update, status=input.status)
+
+    return OrderBulkStatusResult(
+        status=input.status,
+        updated=sum(1 for r in results if r.status == "updated"),
+        unchanged=sum(1 for r in results if r.status == "unchanged"),
+        not_found=sum(1 for r in results if r.status == "not_found"),
+        results=results
+    )
+
 @api_router.put("/orders/{order_id}", response_model=Order)
 async def update_order(order_id: str, input: OrderUpdate, admin: dict = Depends(get_current_admin)):
     existing = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not existing:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    await db.orders.update_one({"id": order_id}, {"$set": {"status": input.status}})
+    await db.orders.update_one({"id": order_id}, {"$set": {"status": input.status, "updated_at": sync_timestamp()}})
+    if existing.get('status') != input.status:
+        await publish_order_event("order_status_changed", ids=[order_id], status=input.status)
     
     updated = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -757,12 +2447,65 @@ async def delete_order(order_id: str, admin: dict = Depends(get_current_admin)):
     result = await db.orders.delete_one({"id": order_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    await record_tombstones("orders", [order_id])
+    await publish_order_event("order_deleted", ids=[order_id])
     return {"message": "Order deleted"}
 
+# Live admin order feed. Browsers cannot set headers on a WebSocket, so the admin
+# token is passed as ?token=. Events are deltas from the live event bus; no
+# query runs per event, however many admin tabs are open.
+ORDER_FEED_PING_INTERVAL = float(os.environ.get('ORDER_FEED_PING_INTERVAL', 30))
+
+@api_router.websocket("/orders/feed")
+async def order_feed(websocket: WebSocket, token: str = ""):
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        admin = await db.admins.find_one({"email": payload.get('email')}, {"_id": 0, "email": 1})
+    except jwt.InvalidTokenError:
+        admin, payload = None, {}
+    if not admin:
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    queue = live_events.subscribe("orders")
+    # Close when the token would have expired, like the REST endpoints would start failing
+    expires_in = max(payload['exp'] - time.time(), 0) if 'exp' in payload else None
+
+    async def send_events():
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), ORDER_FEED_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_json(event)
+
+    async def receive_until_closed():
+        try:
+            while True:
+                await websocket.receive_text()  # Clients have nothing to say; this notices a disconnect
+        except WebSocketDisconnect:
+            pass
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_until_closed())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=expires_in, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            await websocket.close(code=4401)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        live_events.unsubscribe("orders", queue)
+        for task in tasks:
+            task.cancel()
+
 # Testimonial Routes
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials():
-    testimonials = await db.testimonials.find({"active": True}, {"_id": 0}).to_list(1000)
+async def get_testimonials(request: Request):
+    return catalog_snapshot.response("testimonials", request) or await load_testimonials(catalog_db)
+
+async def load_testimonials(database) -> List[dict]:
+    testimonials = await database.testimonials.find({"active": True}, {"_id": 0}).to_list(1000)
     for t in testimonials:
         if isinstance(t.get('created_at'), str):
             t['created_at'] = datetime.fromisoformat(t['created_at'])
@@ -774,6 +2517,7 @@ async def create_testimonial(input: TestimonialCreate, admin: dict = Depends(get
     doc = testimonial.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     await db.testimonials.insert_one(doc)
+    await cache_invalidator.publish("testimonials")
     return testimonial
 
 @api_router.put("/testimonials/{testimonial_id}", response_model=Testimonial)
@@ -785,6 +2529,7 @@ async def update_testimonial(testimonial_id: str, input: TestimonialUpdate, admi
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if update_data:
         await db.testimonials.update_one({"id": testimonial_id}, {"$set": update_data})
+        await cache_invalidator.publish("testimonials")
     
     updated = await db.testimonials.find_one({"id": testimonial_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -796,12 +2541,13 @@ async def delete_testimonial(testimonial_id: str, admin: dict = Depends(get_curr
     result = await db.testimonials.delete_one({"id": testimonial_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Testimonial not found")
+    await cache_invalidator.publish("testimonials")
     return {"message": "Testimonial deleted"}
 
 # Product Reviews Routes
 @api_router.get("/reviews/{product_id}", response_model=List[ProductReview])
 async def get_product_reviews(product_id: str):
-    reviews = await db.product_reviews.find(
+    reviews = await catalog_db.product_reviews.find(
         {"product_id": product_id, "approved": True}, 
         {"_id": 0}
     ).sort("created_at", -1).to_list(1000)
@@ -810,19 +2556,23 @@ async def get_product_reviews(product_id: str):
             r['created_at'] = datetime.fromisoformat(r['created_at'])
     return reviews
 
-@api_router.get("/reviews", response_model=List[ProductReview])
-async def get_all_reviews(admin: dict = Depends(get_current_admin)):
+@api_router.get("/reviews", response_model=Union[List[ProductReview], SyncPage[ProductReview]])
+async def get_all_reviews(since: Optional[str] = None, admin: dict = Depends(get_current_admin)):
+    if since is not None:
+        return await sync_page("product_reviews", since, ProductReview)
     reviews = await db.product_reviews.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     for r in reviews:
         if isinstance(r.get('created_at'), str):
             r['created_at'] = datetime.fromisoformat(r['created_at'])
     return reviews
 
-@api_router.post("/reviews", response_model=ProductReview, status_code=status.HTTP_201_CREATED)
+@api_router.post("/reviews", response_model=ProductReview, status_code=status.HTTP_201_CREATED, dependencies=[Depends(rate_limit("create_review"))])
 async def create_review(input: ProductReviewCreate):
     review = ProductReview(**input.model_dump())
+    review.updated_at = review.created_at
     doc = review.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc['updated_at'] = sync_timestamp(review.updated_at)
     await db.product_reviews.insert_one(doc)
     return review
 
@@ -834,7 +2584,9 @@ async def update_review(review_id: str, input: ProductReviewUpdate, admin: dict
     
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if update_data:
+        update_data['updated_at'] = sync_timestamp()
         await db.product_reviews.update_one({"id": review_id}, {"$set": update_data})
+        await cache_invalidator.publish("product_reviews")
     
     updated = await db.product_reviews.find_one({"id": review_id}, {"_id": 0})
     if isinstance(updated.get('created_at'), str):
@@ -846,30 +2598,19 @@ async def delete_review(review_id: str, admin: dict = Depends(get_current_admin)
     result = await db.product_reviews.delete_one({"id": review_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Review not found")
+    await record_tombstones("product_reviews", [review_id])
+    await cache_invalidator.publish("product_reviews")
     return {"message": "Review deleted"}
 
 # Payment Settings Routes
 @api_router.get("/payment-settings", response_model=PaymentSettings)
 async def get_payment_settings():
-    settings = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
-    if not settings:
-        default_settings = PaymentSettings(
-            account_holder_name="Herbalife Türkiye",
-            iban="TR00 0000 0000 0000 0000 0000 00",
-            bank_name="Banka Adı"
-        )
-        doc = default_settings.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        await db.payment_settings.insert_one(doc)
-        return default_settings
-    if isinstance(settings.get('updated_at'), str):
-        settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
-    return settings
+    return await settings_service.get("payment_settings")
 
 @api_router.put("/payment-settings", response_model=PaymentSettings)
 async def update_payment_settings(input: PaymentSettingsUpdate, admin: dict = Depends(get_current_admin)):
     # Get current settings to preserve existing values for optional fields
-    current = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
+    current = await settings_service.get("payment_settings")
     
     # Build update data, using current values as defaults for None fields
     update_data = input.model_dump()
@@ -891,25 +2632,14 @@ async def update_payment_settings(input: PaymentSettingsUpdate, admin: dict = De
         {"$set": doc},
         upsert=True
     )
-    
-    updated = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
-    if isinstance(updated.get('updated_at'), str):
-        updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
-    return updated
+    settings_service.set("payment_settings", doc)
+    await cache_invalidator.publish("payment_settings")
+    return await settings_service.get("payment_settings")
 
 # Site Settings Routes
 @api_router.get("/site-settings", response_model=SiteSettings)
 async def get_site_settings():
-    settings = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
-    if not settings:
-        default_settings = SiteSettings()
-        doc = default_settings.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        await db.site_settings.insert_one(doc)
-        return default_settings
-    if isinstance(settings.get('updated_at'), str):
-        settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
-    return settings
+    return await settings_service.get("site_settings")
 
 @api_router.put("/site-settings", response_model=SiteSettings)
 async def update_site_settings(input: SiteSettingsUpdate, admin: dict = Depends(get_current_admin)):
@@ -922,17 +2652,160 @@ async def update_site_settings(input: SiteSettingsUpdate, admin: dict = Depends(
         {"$set": doc},
         upsert=True
     )
-    
-    updated = await db.site_settings.find_one({"id": "site_settings"}, {"_id": 0})
-    if isinstance(updated.get('updated_at'), str):
-        updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
-    return updated
+    settings_service.set("site_settings", doc)
+    await cache_invalidator.publish("site_settings")
+    return await settings_service.get("site_settings")
 
 # Card Payment Routes
-import hmac
-import hashlib
-import httpx
-import json
+if TYPE_CHECKING:
+    import httpx
+
+_payment_http: Optional["httpx.AsyncClient"] = None
+
+# Provider endpoints; point them at a local stub to inject faults
+IYZICO_BASE_URL = os.environ.get('IYZICO_BASE_URL')  # Overrides the sandbox/live choice
+PAYTR_BASE_URL = os.environ.get('PAYTR_BASE_URL', 'https://www.paytr.com')
+
+# Per-phase timeouts (seconds). Read is per operation: init waits on the provider's
+# 3DS/token setup, status checks are cheap and retried by the reconciler.
+PAYMENT_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_CONNECT_TIMEOUT', 3))
+PAYMENT_WRITE_TIMEOUT = float(os.environ.get('PAYMENT_WRITE_TIMEOUT', 5))
+PAYMENT_POOL_TIMEOUT = float(os.environ.get('PAYMENT_POOL_TIMEOUT', 2))
+PAYMENT_READ_TIMEOUTS = {
+    "init": float(os.environ.get('PAYMENT_INIT_READ_TIMEOUT', 15)),
+    "status": float(os.environ.get('PAYMENT_STATUS_READ_TIMEOUT', 5)),
+}
+
+# Circuit breaker, per provider and per worker. It opens when at least MIN_CALLS
+# calls in the last WINDOW seconds ran and FAILURE_RATE of them failed. Failures
+# are errors, timeouts, 5xx and calls slower than SLOW_CALL. After OPEN_SECONDS a
+# single probe call decides between closing and opening again.
+PAYMENT_BREAKER_WINDOW = float(os.environ.get('PAYMENT_BREAKER_WINDOW', 60))
+PAYMENT_BREAKER_MIN_CALLS = int(os.environ.get('PAYMENT_BREAKER_MIN_CALLS', 10))
+PAYMENT_BREAKER_FAILURE_RATE = float(os.environ.get('PAYMENT_BREAKER_FAILURE_RATE', 0.5))
+PAYMENT_BREAKER_SLOW_CALL = float(os.environ.get('PAYMENT_BREAKER_SLOW_CALL', 8))
+PAYMENT_BREAKER_OPEN_SECONDS = float(os.environ.get('PAYMENT_BREAKER_OPEN_SECONDS', 30))
+
+class PaymentProviderUnavailable(Exception):
+    """The provider did not answer usefully: circuit open, timeout, connection error or 5xx"""
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, window: float = PAYMENT_BREAKER_WINDOW, min_calls: int = PAYMENT_BREAKER_MIN_CALLS,
+                 failure_rate: float = PAYMENT_BREAKER_FAILURE_RATE, slow_call: float = PAYMENT_BREAKER_SLOW_CALL,
+                 open_seconds: float = PAYMENT_BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._calls: deque = deque()  # (monotonic time, failed)
+        self._opened_at = 0.0
+        self._probing = False
+        PAYMENT_CIRCUIT_STATE.labels(name).set(0)
+
+    @property
+    def available(self) -> bool:
+        """False while open and still cooling down"""
+        return self.state != self.OPEN or time.monotonic() - self._opened_at >= self.open_seconds
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if not self.available:
+                PAYMENT_CIRCUIT_EVENTS.labels(self.name, "rejected").inc()
+                return False
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                PAYMENT_CIRCUIT_EVENTS.labels(self.name, "rejected").inc()
+                return False
+            self._probing = True
+        return True
+
+    def record(self, failed: bool, seconds: float):
+        failed = failed or seconds > self.slow_call
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open(now)
+            else:
+                self._calls.clear()
+                self._transition(self.CLOSED)
+            return
+        self._calls.append((now, failed))
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+        failures = sum(1 for _, f in self._calls if f)
+        if self.state == self.CLOSED and len(self._calls) >= self.min_calls and failures >= self.failure_rate * len(self._calls):
+            self._open(now)
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._calls.clear()
+        self._transition(self.OPEN)
+
+    def _transition(self, state: str):
+        self.state = state
+        PAYMENT_CIRCUIT_STATE.labels(self.name).set(self.STATE_VALUES[state])
+        PAYMENT_CIRCUIT_EVENTS.labels(self.name, state).inc()
+        logger.warning(f"Payment circuit for {self.name} is now {state}")
+
+payment_breakers = {name: CircuitBreaker(name) for name in ("iyzico", "paytr")}
+
+def get_payment_http() -> "httpx.AsyncClient":
+    """Shared, connection-pooled HTTP client for payment provider calls"""
+    global _payment_http
+    if _payment_http is None or _payment_http.is_closed:
+        import httpx  # Loaded on the first payment call to keep it out of cold start
+        _payment_http = httpx.AsyncClient(
+            timeout=provider_timeout("init"),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+    return _payment_http
+
+def provider_timeout(operation: str) -> "httpx.Timeout":
+    import httpx
+    return httpx.Timeout(
+        PAYMENT_READ_TIMEOUTS[operation],
+        connect=PAYMENT_CONNECT_TIMEOUT, write=PAYMENT_WRITE_TIMEOUT, pool=PAYMENT_POOL_TIMEOUT
+    )
+
+async def post_to_provider(provider: str, operation: str, url: str, **kwargs) -> "httpx.Response":
+    """POST to a payment provider through its circuit breaker and record the latency.
+
+    Raises PaymentProviderUnavailable instead of waiting on a provider that is down.
+    """
+    import httpx
+
+    breaker = payment_breakers[provider]
+    if not breaker.allow():
+        raise PaymentProviderUnavailable(f"{provider} circuit is open")
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await get_payment_http().post(url, timeout=provider_timeout(operation), **kwargs)
+        outcome = str(response.status_code)
+    except httpx.TransportError as e:
+        outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+        raise PaymentProviderUnavailable(f"{provider} {operation}: {type(e).__name__}") from e
+    finally:
+        elapsed = time.perf_counter() - start
+        breaker.record(outcome in ("error", "timeout") or outcome.startswith("5"), elapsed)
+        PAYMENT_PROVIDER_LATENCY.labels(provider, operation, outcome).observe(elapsed)
+    if response.status_code >= 500:
+        raise PaymentProviderUnavailable(f"{provider} {operation}: HTTP {response.status_code}")
+    return response
+
+async def close_payment_http():
+    global _payment_http
+    if _payment_http is not None:
+        await _payment_http.aclose()
+        _payment_http = None
 
 def generate_iyzico_auth_header(api_key: str, secret_key: str, request_body: str) -> str:
     """Generate Iyzico authorization header"""
@@ -969,7 +2842,7 @@ def generate_paytr_hash(merchant_id: str, user_ip: str, merchant_oid: str, email
 @api_router.get("/card-payment/status")
 async def get_card_payment_status():
     """Get card payment availability status for checkout"""
-    settings = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
+    settings = await settings_service.get("payment_settings")
     if not settings:
         return {
             "card_payment_enabled": False,
@@ -984,16 +2857,24 @@ async def get_card_payment_status():
             available_providers.append('iyzico')
         if provider in ['paytr', 'both'] and settings.get('paytr_merchant_id') and settings.get('paytr_merchant_key'):
             available_providers.append('paytr')
+        # Do not offer a provider whose circuit is open
+        available_providers = [p for p in available_providers if payment_breakers[p].available]
     
     return {
         "card_payment_enabled": settings.get('card_payment_enabled', False) and len(available_providers) > 0,
         "available_providers": available_providers
     }
 
-@api_router.post("/card-payment/init-iyzico")
-async def init_iyzico_payment(request: CardPaymentRequest):
+@api_router.post("/card-payment/init-iyzico", dependencies=[Depends(rate_limit("card_payment_init"))])
+async def init_iyzico_payment(request: CardPaymentRequest, idempotency_key: Optional[str] = Header(None)):
     """Initialize Iyzico 3DS payment"""
-    settings = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
+    return await run_idempotent(
+        "init_iyzico", idempotency_key, request, lambda: start_card_payment("iyzico", request),
+        should_store=lambda result: result.status != "failure"
+    )
+
+async def start_iyzico_payment(request: CardPaymentRequest) -> CardPaymentResponse:
+    settings = await settings_service.get("payment_settings")
     
     if not settings or not settings.get('card_payment_enabled'):
         raise HTTPException(status_code=400, detail="Kredi kartı ödemesi aktif değil")
@@ -1005,7 +2886,7 @@ async def init_iyzico_payment(request: CardPaymentRequest):
     if not api_key or not secret_key:
         raise HTTPException(status_code=400, detail="Iyzico API bilgileri eksik")
     
-    base_url = "https://sandbox-api.iyzipay.com" if is_sandbox else "https://api.iyzipay.com"
+    base_url = IYZICO_BASE_URL or ("https://sandbox-api.iyzipay.com" if is_sandbox else "https://api.iyzipay.com")
     callback_url = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001') + "/api/card-payment/iyzico-callback"
     
     # Prepare basket items
@@ -1073,17 +2954,16 @@ async def init_iyzico_payment(request: CardPaymentRequest):
         request_body = json.dumps(payload)
         auth_header = generate_iyzico_auth_header(api_key, secret_key, request_body)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{base_url}/payment/3dsecure/initialize",
-                content=request_body,
-                headers={
-                    "Authorization": auth_header,
-                    "Content-Type": "application/json"
-                },
-                timeout=30.0
-            )
-            result = response.json()
+        response = await post_to_provider(
+            "iyzico", "init",
+            f"{base_url}/payment/3dsecure/initialize",
+            content=request_body,
+            headers={
+                "Authorization": auth_header,
+                "Content-Type": "application/json"
+            }
+        )
+        result = response.json()
         
         if result.get('status') == 'success':
             # Store pending payment in DB
@@ -1107,6 +2987,8 @@ async def init_iyzico_payment(request: CardPaymentRequest):
                 status="failure",
                 error_message=result.get('errorMessage', 'Ödeme başlatılamadı')
             )
+    except PaymentProviderUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Iyzico payment error: {str(e)}")
         return CardPaymentResponse(
@@ -1114,10 +2996,16 @@ async def init_iyzico_payment(request: CardPaymentRequest):
             error_message=f"Ödeme hatası: {str(e)}"
         )
 
-@api_router.post("/card-payment/init-paytr")
-async def init_paytr_payment(request: CardPaymentRequest):
+@api_router.post("/card-payment/init-paytr", dependencies=[Depends(rate_limit("card_payment_init"))])
+async def init_paytr_payment(request: CardPaymentRequest, idempotency_key: Optional[str] = Header(None)):
     """Initialize PayTR iframe payment"""
-    settings = await db.payment_settings.find_one({"id": "payment_settings"}, {"_id": 0})
+    return await run_idempotent(
+        "init_paytr", idempotency_key, request, lambda: start_card_payment("paytr", request),
+        should_store=lambda result: result.status != "failure"
+    )
+
+async def start_paytr_payment(request: CardPaymentRequest) -> CardPaymentResponse:
+    settings = await settings_service.get("payment_settings")
     
     if not settings or not settings.get('card_payment_enabled'):
         raise HTTPException(status_code=400, detail="Kredi kartı ödemesi aktif değil")
@@ -1183,13 +3071,12 @@ async def init_paytr_payment(request: CardPaymentRequest):
     }
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://www.paytr.com/odeme/api/get-token",
-                data=payload,
-                timeout=30.0
-            )
-            result = response.json()
+        response = await post_to_provider(
+            "paytr", "init",
+            f"{PAYTR_BASE_URL}/odeme/api/get-token",
+            data=payload
+        )
+        result = response.json()
         
         if result.get('status') == 'success':
             # Store pending payment in DB
@@ -1206,13 +3093,15 @@ async def init_paytr_payment(request: CardPaymentRequest):
             return CardPaymentResponse(
                 status="redirect",
                 iframe_token=result.get('token'),
-                redirect_url=f"https://www.paytr.com/odeme/guvenli/{result.get('token')}"
+                redirect_url=f"{PAYTR_BASE_URL}/odeme/guvenli/{result.get('token')}"
             )
         else:
             return CardPaymentResponse(
                 status="failure",
                 error_message=result.get('reason', 'Ödeme başlatılamadı')
             )
+    except PaymentProviderUnavailable:
+        raise
     except Exception as e:
         logger.error(f"PayTR payment error: {str(e)}")
         return CardPaymentResponse(
@@ -1220,58 +3109,576 @@ async def init_paytr_payment(request: CardPaymentRequest):
             error_message=f"Ödeme hatası: {str(e)}"
         )
 
-@api_router.post("/card-payment/iyzico-callback")
-async def iyzico_callback(request: dict):
-    """Handle Iyzico 3DS callback"""
+PAYMENT_STARTERS = {"iyzico": start_iyzico_payment, "paytr": start_paytr_payment}
+
+def failover_provider(settings: dict, provider: str, request: CardPaymentRequest) -> Optional[str]:
+    """The other provider, when both are enabled and it can take this payment"""
+    if settings.get('card_payment_provider') != 'both':
+        return None
+    if provider == 'iyzico':
+        other = 'paytr'
+        configured = settings.get('paytr_merchant_id') and settings.get('paytr_merchant_key') and settings.get('paytr_merchant_salt')
+    else:
+        # Iyzico's direct API needs the card details, which the PayTR checkout does not send
+        other = 'iyzico'
+        configured = settings.get('iyzico_api_key') and settings.get('iyzico_secret_key') and request.card_number
+    return other if configured and payment_breakers[other].available else None
+
+async def start_card_payment(provider: str, request: CardPaymentRequest) -> CardPaymentResponse:
+    """Start a payment, moving to the other provider when this one is unavailable.
+
+    Init only prepares the 3DS page or payment form and no money moves, so trying
+    the other provider after a timeout cannot charge the customer twice.
+    """
     try:
-        payment_id = request.get('paymentId')
-        status = request.get('status')
-        
-        if status == 'success':
-            # Update pending payment
-            await db.pending_payments.update_one(
-                {"payment_id": payment_id},
-                {"$set": {"status": "success", "updated_at": datetime.now(timezone.utc).isoformat()}}
+        result = await PAYMENT_STARTERS[provider](request)
+        result.provider = provider
+        return result
+    except PaymentProviderUnavailable as e:
+        settings = await settings_service.get("payment_settings") or {}
+        fallback = failover_provider(settings, provider, request)
+        logger.warning(f"Payment provider unavailable ({str(e)}), failover: {fallback or 'none'}")
+    if fallback:
+        PAYMENT_FAILOVERS.labels(provider, fallback).inc()
+        try:
+            result = await PAYMENT_STARTERS[fallback](request)
+            result.provider = fallback
+            return result
+        except PaymentProviderUnavailable as e:
+            logger.warning(f"Failover provider unavailable too: {str(e)}")
+    return CardPaymentResponse(
+        status="failure",
+        error_message="Ödeme sağlayıcısına şu anda ulaşılamıyor, lütfen biraz sonra tekrar deneyin"
+    )
+
+# Payment retention: finished attempts are copied to payment_history and expire
+# from pending_payments after PAYMENT_ARCHIVE_RETENTION (TTL index on archived_at)
+PAYMENT_ARCHIVE_RETENTION = int(os.environ.get('PAYMENT_ARCHIVE_RETENTION', 60 * 60))
+# Attempts still pending after this are archived as "abandoned" and removed
+PAYMENT_ABANDON_AFTER = float(os.environ.get('PAYMENT_ABANDON_AFTER', 7 * 24 * 60 * 60))
+# The sweep always runs, independent of PAYMENT_RECONCILE_ENABLED
+PAYMENT_SWEEP_INTERVAL = float(os.environ.get('PAYMENT_SWEEP_INTERVAL', 10 * 60))
+PAYMENT_ARCHIVE_FIELDS = {"_id": 1, "order_id": 1, "provider": 1, "payment_id": 1, "amount": 1, "status": 1, "created_at": 1, "updated_at": 1}
+
+async def archive_payment(payment: dict, final_status: Optional[str] = None):
+    """Copy a finished attempt into payment_history and schedule it for TTL removal"""
+    now = datetime.now(timezone.utc)
+    await db.payment_history.update_one(
+        {"_id": payment['_id']},
+        {
+            "$set": {
+                "status": final_status or payment.get('status'),
+                "finished_at": payment.get('updated_at') or now.isoformat()
+            },
+            "$setOnInsert": {
+                "order_id": payment.get('order_id'),
+                "provider": payment.get('provider'),
+                "payment_id": payment.get('payment_id'),
+                "amount": payment.get('amount'),
+                "created_at": payment.get('created_at')
+            }
+        },
+        upsert=True
+    )
+    await db.pending_payments.update_one({"_id": payment['_id']}, {"$set": {"archived_at": now}})
+
+async def sweep_pending_payments(batch_size: int = 100) -> dict:
+    """Archive finished rows that missed archiving and drop abandoned attempts"""
+    counts = {"archived": 0, "abandoned": 0}
+    while True:
+        batch = await db.pending_payments.find(
+            {"status": {"$in": ["success", "failed"]}, "archived_at": {"$exists": False}},
+            PAYMENT_ARCHIVE_FIELDS
+        ).limit(batch_size).to_list(batch_size)
+        for payment in batch:
+            await archive_payment(payment)
+        counts["archived"] += len(batch)
+        if len(batch) < batch_size:
+            break
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=PAYMENT_ABANDON_AFTER)).isoformat()
+    while True:
+        batch = await db.pending_payments.find(
+            {"status": "pending", "created_at": {"$lt": cutoff}},
+            PAYMENT_ARCHIVE_FIELDS
+        ).limit(batch_size).to_list(batch_size)
+        for payment in batch:
+            await archive_payment(payment, final_status="abandoned")
+            await db.pending_payments.delete_one({"_id": payment['_id'], "status": "pending"})
+        counts["abandoned"] += len(batch)
+        if len(batch) < batch_size:
+            break
+    return counts
+
+class PaymentSweeper:
+    """Runs sweep_pending_payments every PAYMENT_SWEEP_INTERVAL so pending_payments stays bounded"""
+
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(PAYMENT_SWEEP_INTERVAL)
+            try:
+                counts = await sweep_pending_payments(self.batch_size)
+                if any(counts.values()):
+                    logger.info(f"Payment sweep: {counts}")
+            except Exception as e:
+                logger.error(f"Payment sweep error: {str(e)}")
+
+payment_sweeper = PaymentSweeper()
+
+async def record_payment_result(payment_filter: dict, new_status: str, from_statuses: Optional[List[str]] = None) -> Optional[dict]:
+    """Set the final status of a payment and mirror it on the linked order.
+
+    `from_statuses` limits the transition to payments currently in one of those states.
+    The follow-up steps (history, order, events) finish by setting `applied_at`; a retry
+    after one of them failed finds the payment already in `new_status` without the
+    marker and runs them again. Every step is safe to repeat.
+    """
+    query = {**payment_filter, "status": {"$in": from_statuses}} if from_statuses else payment_filter
+    payment = await db.pending_payments.find_one_and_update(
+        query,
+        {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}, "$unset": {"applied_at": ""}},
+        projection=PAYMENT_ARCHIVE_FIELDS,
+        return_document=ReturnDocument.AFTER
+    )
+    resumed = payment is None
+    if resumed:
+        payment = await db.pending_payments.find_one(
+            {**payment_filter, "status": new_status, "applied_at": {"$exists": False}},
+            PAYMENT_ARCHIVE_FIELDS
+        )
+    if payment:
+        await archive_payment(payment)
+        order_update = {"payment_status": "paid" if new_status == "success" else "failed"}
+        order_query = order_lookup(payment['order_id']) or {"order_code": payment['order_id']}
+        await db.orders.update_one(order_query, {"$set": {**order_update, "updated_at": sync_timestamp()}})
+        confirmed = False
+        if new_status == "success":
+            result = await db.orders.update_one({**order_query, "status": "pending"}, {"$set": {"status": "confirmed", "updated_at": sync_timestamp()}})
+            confirmed = result.modified_count > 0
+            if resumed and not confirmed:
+                # The failed attempt may have confirmed the order before the event went out
+                confirmed = await db.orders.count_documents({**order_query, "status": "confirmed"}, limit=1) > 0
+        await publish_order_event(
+            "payment_status_changed", order_id=payment['order_id'], payment_status=order_update['payment_status'],
+            **({"status": "confirmed"} if confirmed else {})
+        )
+        await live_events.publish(f"payment:{payment['order_id']}", {"order_id": payment['order_id'], "status": new_status})
+        await db.pending_payments.update_one({"_id": payment['_id'], "status": new_status}, {"$set": {"applied_at": datetime.now(timezone.utc)}})
+    return payment
+
+# Payment callbacks are verified, queued in payment_callbacks and acknowledged at once;
+# PaymentCallbackQueue workers apply the state changes.
+PAYMENT_CALLBACK_WORKERS = int(os.environ.get('PAYMENT_CALLBACK_WORKERS', 2))
+PAYMENT_CALLBACK_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_CALLBACK_MAX_ATTEMPTS', 10))
+PAYMENT_CALLBACK_LOCK_TIMEOUT = float(os.environ.get('PAYMENT_CALLBACK_LOCK_TIMEOUT', 60))
+PAYMENT_CALLBACK_RETENTION = int(os.environ.get('PAYMENT_CALLBACK_RETENTION', 7 * 24 * 60 * 60))
+
+async def read_callback_payload(request: Request) -> dict:
+    """Providers post form data; JSON is accepted as well"""
+    if 'json' in request.headers.get('content-type', ''):
+        body = await request.json()
+        return body if isinstance(body, dict) else {}
+    form = await request.form()
+    return {k: v for k, v in form.items() if isinstance(v, str)}
+
+def verify_paytr_callback(settings: dict, payload: dict) -> bool:
+    merchant_key = settings.get('paytr_merchant_key')
+    merchant_salt = settings.get('paytr_merchant_salt')
+    if not merchant_key or not merchant_salt:
+        return False
+    hash_str = f"{payload.get('merchant_oid', '')}{merchant_salt}{payload.get('status', '')}{payload.get('total_amount', '')}"
+    expected = base64.b64encode(
+        hmac.new(merchant_key.encode('utf-8'), hash_str.encode('utf-8'), hashlib.sha256).digest()
+    ).decode('utf-8')
+    return hmac.compare_digest(expected, str(payload.get('hash', '')))
+
+def verify_iyzico_callback(settings: dict, payload: dict) -> bool:
+    """Check the callback signature; callbacks without one are rejected"""
+    signature = payload.get('signature')
+    if not signature:
+        return False
+    secret_key = settings.get('iyzico_secret_key')
+    if not secret_key:
+        return False
+    fields = ['conversationData', 'conversationId', 'mdStatus', 'paymentId', 'status']
+    message = ":".join(str(payload.get(f, '')) for f in fields)
+    expected = hmac.new(secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, str(signature).lower())
+
+class PaymentCallbackQueue:
+    """Mongo-backed queue of verified provider callbacks"""
+
+    def __init__(self, workers: int = PAYMENT_CALLBACK_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, provider: str, dedupe_key: str, payload: dict):
+        """Store a callback durably; repeated deliveries of the same callback are ignored"""
+        now = datetime.now(timezone.utc)
+        try:
+            await db.payment_callbacks.insert_one({
+                "_id": f"{provider}:{dedupe_key}",
+                "provider": provider,
+                "payload": payload,
+                "status": "queued",
+                "attempts": 0,
+                "created_at": now,
+                "available_at": now
+            })
+        except DuplicateKeyError:
+            return
+        self._wakeup.set()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db.payment_callbacks.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "available_at": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lt": now}}
+            ]},
+            {"$set": {"status": "processing", "locked_until": now + timedelta(seconds=PAYMENT_CALLBACK_LOCK_TIMEOUT)}, "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except PyMongoError as e:
+                logger.error(f"Payment callback queue error: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        try:
+            await self.process(job['provider'], job['payload'])
+            await db.payment_callbacks.update_one(
+                {"_id": job['_id']},
+                {"$set": {"status": "done", "done_at": datetime.now(timezone.utc)}, "$unset": {"locked_until": ""}}
             )
-            return {"status": "success"}
-        else:
-            await db.pending_payments.update_one(
-                {"payment_id": payment_id},
-                {"$set": {"status": "failed", "updated_at": datetime.now(timezone.utc).isoformat()}}
+        except Exception as e:
+            logger.error(f"Payment callback processing error ({job['_id']}): {str(e)}")
+            failed = job['attempts'] >= PAYMENT_CALLBACK_MAX_ATTEMPTS
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=min(2 ** job['attempts'], 300))
+            await db.payment_callbacks.update_one(
+                {"_id": job['_id']},
+                {"$set": {"status": "failed" if failed else "queued", "available_at": retry_at, "error": str(e)}, "$unset": {"locked_until": ""}}
             )
-            return {"status": "failed"}
-    except Exception as e:
-        logger.error(f"Iyzico callback error: {str(e)}")
-        return {"status": "error"}
+
+    @staticmethod
+    async def process(provider: str, payload: dict):
+        """Apply a callback; safe to run more than once for the same payload"""
+        new_status = "success" if payload.get('status') == "success" else "failed"
+        # A late success may still override a payment that was given up on
+        from_statuses = ["pending", "failed"] if new_status == "success" else ["pending"]
+        if provider == "paytr":
+            await record_payment_result({"order_id": payload.get('merchant_oid')}, new_status, from_statuses)
+        else:
+            await record_payment_result({"payment_id": payload.get('paymentId')}, new_status, from_statuses)
+
+payment_callback_queue = PaymentCallbackQueue()
+
+@api_router.post("/card-payment/iyzico-callback")
+async def iyzico_callback(request: Request):
+    """Handle Iyzico 3DS callback"""
+    payload = await read_callback_payload(request)
+    settings = await settings_service.get("payment_settings")
+    payment_id = payload.get('paymentId')
+    if not payment_id or not verify_iyzico_callback(settings, payload):
+        raise HTTPException(status_code=400, detail="Invalid callback")
+    new_status = "success" if payload.get('status') == 'success' else "failed"
+    await payment_callback_queue.enqueue("iyzico", f"{payment_id}:{new_status}", payload)
+    return {"status": new_status}
 
 @api_router.post("/card-payment/paytr-callback")
-async def paytr_callback(request: dict):
+async def paytr_callback(request: Request):
     """Handle PayTR callback"""
-    try:
-        merchant_oid = request.get('merchant_oid')
-        status = request.get('status')
-        
-        new_status = "success" if status == "success" else "failed"
-        await db.pending_payments.update_one(
-            {"order_id": merchant_oid},
-            {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
-        
-        return "OK"
-    except Exception as e:
-        logger.error(f"PayTR callback error: {str(e)}")
-        return "OK"
+    payload = await read_callback_payload(request)
+    settings = await settings_service.get("payment_settings")
+    merchant_oid = payload.get('merchant_oid')
+    if not merchant_oid or not verify_paytr_callback(settings, payload):
+        raise HTTPException(status_code=400, detail="PAYTR notification failed: bad hash")
+    await payment_callback_queue.enqueue("paytr", f"{merchant_oid}:{payload.get('status')}", payload)
+    # PayTR only stops retrying on a plain "OK" body
+    return PlainTextResponse("OK")
 
 @api_router.get("/card-payment/check/{order_id}")
 async def check_payment_status(order_id: str):
     """Check payment status for an order"""
-    payment = await db.pending_payments.find_one({"order_id": order_id}, {"_id": 0})
+    payment = await db.pending_payments.find_one({"order_id": order_id}, {"_id": 0, "status": 1}, sort=[("created_at", -1)])
+    if not payment:
+        payment = await db.payment_history.find_one({"order_id": order_id}, {"_id": 0, "status": 1}, sort=[("created_at", -1)])
     if not payment:
         return {"status": "not_found"}
     return {"status": payment.get('status', 'pending')}
 
+PAYMENT_EVENTS_HEARTBEAT = float(os.environ.get('PAYMENT_EVENTS_HEARTBEAT', 15))
+PAYMENT_EVENTS_RECHECK = float(os.environ.get('PAYMENT_EVENTS_RECHECK', 60))
+PAYMENT_EVENTS_TIMEOUT = float(os.environ.get('PAYMENT_EVENTS_TIMEOUT', 15 * 60))
+PAYMENT_FINAL_STATUSES = ("success", "failed")
+
+@api_router.get("/card-payment/events/{order_id}")
+async def payment_events(order_id: str):
+    """Server-Sent Events: the current payment status, then every change until it is final.
+
+    Replaces polling /card-payment/check; a slow re-check runs in case an event
+    was missed (e.g. the payment was expired by the sweeper).
+    """
+    topic = f"payment:{order_id}"
+
+    async def stream():
+        # Subscribed only once the stream runs, so a client gone before the first
+        # chunk leaves no queue behind; still before reading, so no change slips in between
+        queue = live_events.subscribe(topic)
+        try:
+            current = await check_payment_status(order_id)
+            yield sse_message("status", current)
+            deadline = time.monotonic() + PAYMENT_EVENTS_TIMEOUT
+            last_check = time.monotonic()
+            while current['status'] not in PAYMENT_FINAL_STATUSES and time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), PAYMENT_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_check < PAYMENT_EVENTS_RECHECK:
+                        yield b": ping\n\n"
+                        continue
+                    last_check = time.monotonic()
+                    event = await check_payment_status(order_id)
+                    if event['status'] == current['status']:
+                        yield b": ping\n\n"
+                        continue
+                current = {"status": event['status']}
+                yield sse_message("status", current)
+        finally:
+            live_events.unsubscribe(topic, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Stop nginx from buffering the stream
+    })
+
+# Pending payment reconciliation
+PAYMENT_RECONCILE_ENABLED = os.environ.get('PAYMENT_RECONCILE_ENABLED', 'true').lower() == 'true'
+PAYMENT_RECONCILE_INTERVAL = float(os.environ.get('PAYMENT_RECONCILE_INTERVAL', 60))
+# Pending payments younger than this are left to the provider callback
+PAYMENT_RECONCILE_STALE_AFTER = float(os.environ.get('PAYMENT_RECONCILE_STALE_AFTER', 15 * 60))
+# Payments the provider still reports as unfinished after this are marked failed
+PAYMENT_RECONCILE_EXPIRE_AFTER = float(os.environ.get('PAYMENT_RECONCILE_EXPIRE_AFTER', 2 * 60 * 60))
+PAYMENT_RECONCILE_BATCH_SIZE = int(os.environ.get('PAYMENT_RECONCILE_BATCH_SIZE', 50))
+PAYMENT_RECONCILE_CONCURRENCY = int(os.environ.get('PAYMENT_RECONCILE_CONCURRENCY', 5))
+
+async def query_iyzico_payment_status(settings: dict, payment: dict) -> Optional[str]:
+    """Ask Iyzico for the final state of a payment; None while it is unfinished"""
+    if not payment.get('payment_id'):
+        return None
+    base_url = IYZICO_BASE_URL or ("https://sandbox-api.iyzipay.com" if settings.get('iyzico_sandbox', True) else "https://api.iyzipay.com")
+    request_body = json.dumps({
+        "locale": "tr",
+        "conversationId": payment['order_id'],
+        "paymentId": payment['payment_id']
+    })
+    response = await post_to_provider(
+        "iyzico", "status",
+        f"{base_url}/payment/detail",
+        content=request_body,
+        headers={
+            "Authorization": generate_iyzico_auth_header(settings['iyzico_api_key'], settings['iyzico_secret_key'], request_body),
+            "Content-Type": "application/json"
+        }
+    )
+    result = response.json()
+    if result.get('status') != 'success':
+        return None
+    payment_status = result.get('paymentStatus')
+    if payment_status == 'SUCCESS':
+        return "success"
+    if payment_status == 'FAILURE':
+        return "failed"
+    return None
+
+async def query_paytr_payment_status(settings: dict, payment: dict) -> Optional[str]:
+    """Ask PayTR (durum-sorgu) whether the order was paid; None while it is not"""
+    merchant_id = settings['paytr_merchant_id']
+    paytr_token = base64.b64encode(
+        hmac.new(
+            key=settings['paytr_merchant_key'].encode('utf-8'),
+            msg=(merchant_id + payment['order_id'] + settings['paytr_merchant_salt']).encode('utf-8'),
+            digestmod=hashlib.sha256
+        ).digest()
+    ).decode('utf-8')
+    response = await post_to_provider(
+        "paytr", "status",
+        f"{PAYTR_BASE_URL}/odeme/durum-sorgu",
+        data={"merchant_id": merchant_id, "merchant_oid": payment['order_id'], "paytr_token": paytr_token}
+    )
+    result = response.json()
+    return "success" if result.get('status') == 'success' else None
+
+class PaymentReconciler:
+    """Resolves pending payments whose provider callback never arrived"""
+
+    def __init__(self, batch_size: int = PAYMENT_RECONCILE_BATCH_SIZE, concurrency: int = PAYMENT_RECONCILE_CONCURRENCY):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if PAYMENT_RECONCILE_ENABLED:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(PAYMENT_RECONCILE_INTERVAL)
+            try:
+                counts = await self.run_once()
+                if any(counts.values()):
+                    logger.info(f"Payment reconciliation: {counts}")
+            except Exception as e:
+                logger.error(f"Payment reconciliation error: {str(e)}")
+
+    async def run_once(self) -> dict:
+        """Check every stale pending payment once, oldest first, in batches"""
+        now = datetime.now(timezone.utc)
+        cutoff = (now - timedelta(seconds=PAYMENT_RECONCILE_STALE_AFTER)).isoformat()
+        settings = await settings_service.get("payment_settings")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts = {"checked": 0, "success": 0, "failed": 0, "pending": 0}
+
+        async def reconcile(payment: dict):
+            async with semaphore:
+                outcome = await self._reconcile(settings, payment, now)
+            counts["checked"] += 1
+            counts[outcome or "pending"] += 1
+
+        query = {"status": "pending", "created_at": {"$lt": cutoff}}
+        while True:
+            batch = await db.pending_payments.find(
+                query,
+                {"_id": 1, "order_id": 1, "provider": 1, "payment_id": 1, "created_at": 1}
+            ).sort([("created_at", 1), ("_id", 1)]).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+            await asyncio.gather(*(reconcile(p) for p in batch))
+            if len(batch) < self.batch_size:
+                break
+            # Continue after the last row; _id breaks ties between equal timestamps
+            last = batch[-1]
+            query = {
+                "status": "pending",
+                "created_at": {"$lt": cutoff},
+                "$or": [
+                    {"created_at": {"$gt": last['created_at']}},
+                    {"created_at": last['created_at'], "_id": {"$gt": last['_id']}}
+                ]
+            }
+        return counts
+
+    async def _reconcile(self, settings: dict, payment: dict, now: datetime) -> Optional[str]:
+        # Claim the row so several workers do not query the provider for it at once
+        claim = await db.pending_payments.update_one(
+            {"_id": payment['_id'], "status": "pending", "reconcile_until": {"$not": {"$gt": now.isoformat()}}},
+            {"$set": {"reconcile_until": (now + timedelta(seconds=PAYMENT_RECONCILE_INTERVAL)).isoformat()}}
+        )
+        if claim.modified_count == 0:
+            return None
+
+        import httpx
+
+        outcome = None
+        try:
+            if payment.get('provider') == 'iyzico' and settings.get('iyzico_api_key') and settings.get('iyzico_secret_key'):
+                outcome = await query_iyzico_payment_status(settings, payment)
+            elif payment.get('provider') == 'paytr' and settings.get('paytr_merchant_id') and settings.get('paytr_merchant_key') and settings.get('paytr_merchant_salt'):
+                outcome = await query_paytr_payment_status(settings, payment)
+        except (httpx.HTTPError, PaymentProviderUnavailable, ValueError) as e:
+            logger.warning(f"Payment status query failed for {payment['order_id']}: {str(e)}")
+
+        if outcome is None:
+            age = now - datetime.fromisoformat(payment['created_at'])
+            if age > timedelta(seconds=PAYMENT_RECONCILE_EXPIRE_AFTER):
+                outcome = "failed"
+        if outcome:
+            await record_payment_result({"_id": payment['_id']}, outcome, from_statuses=["pending"])
+        return outcome
+
+payment_reconciler = PaymentReconciler()
+
+# Request profiling (Yönetici only). Send `X-Profile: 1` with a super admin token
+# and the request is run under cProfile; the stats are kept in PROFILE_DIR.
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', '/tmp/profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+@api_router.get("/profiles")
+async def list_profiles(admin: dict = Depends(require_super_admin)):
+    if not PROFILE_DIR.exists():
+        return []
+    files = sorted(PROFILE_DIR.glob("*.json"), key=lambda f: f.stat().st_mtime, reverse=True)
+    return [json.loads(f.read_text()) for f in files]
+
+@api_router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin: dict = Depends(require_super_admin)):
+    path = PROFILE_DIR / f"{Path(profile_id).name}.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return json.loads(path.read_text())
+
+@api_router.get("/profiles/{profile_id}/pstats")
+async def download_profile(profile_id: str, admin: dict = Depends(require_super_admin)):
+    """Download the raw stats (open with `python -m pstats` or snakeviz)"""
+    path = PROFILE_DIR / f"{Path(profile_id).name}.pstats"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
 # File Upload Route
-@api_router.post("/upload")
+@api_router.post("/upload", dependencies=[Depends(rate_limit("upload"))])
 async def upload_file(file: UploadFile = File(...)):
     try:
         allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'application/pdf']
@@ -1287,10 +3694,9 @@ async def upload_file(file: UploadFile = File(...)):
         file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
         file_name = f"{file_id}.{file_ext}"
         
-        upload_dir = Path("/app/uploads")
-        upload_dir.mkdir(exist_ok=True)
+        UPLOAD_DIR.mkdir(exist_ok=True)
         
-        file_path = upload_dir / file_name
+        file_path = UPLOAD_DIR / file_name
         with open(file_path, 'wb') as f:
             f.write(contents)
         
@@ -1305,11 +3711,184 @@ async def upload_file(file: UploadFile = File(...)):
 
 app.include_router(api_router)
 
-# Mount uploads directory for static file serving
-upload_dir = Path("/app/uploads")
-upload_dir.mkdir(exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="/app/uploads"), name="uploads")
-
+class MetricsMiddleware:
+    """Counts, times and tracks in-flight requests per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def route_template(scope) -> str:
+        # Same precedence as Starlette's router: a full match (path and method) wins,
+        # otherwise the first path-only match, which answers 405
+        partial = None
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        route = self.route_template(scope)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        token = current_route.set(f"{method} {route}")
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_route.reset(token)
+            in_flight.dec()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+
+class ProfilingMiddleware:
+    """Profiles single requests that carry an X-Profile header from a Yönetici.
+
+    cProfile sees every coroutine on the event loop while it is enabled, so
+    profile on a quiet worker when possible. Requests without the header only
+    pay for the header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        if b"x-profile" not in headers or not await self._is_super_admin(headers.get(b"authorization", b"")):
+            return await self.app(scope, receive, send)
+
+        profile_id = uuid.uuid4().hex
+        session = ProfileSession()
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        async with self._lock:  # One cProfile at a time
+            profiler = cProfile.Profile()
+            token = current_profile.set(session)
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile)
+            finally:
+                profiler.disable()
+                total = time.perf_counter() - start
+                current_profile.reset(token)
+                self._save(profile_id, profiler, session, scope, total)
+
+    @staticmethod
+    async def _is_super_admin(authorization: bytes) -> bool:
+        token = authorization.decode('latin-1').removeprefix("Bearer ").strip()
+        if not token:
+            return False
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
+            return False
+        admin = await db.admins.find_one({"email": payload.get('email')}, {"_id": 0, "role": 1})
+        return bool(admin) and admin.get('role') == 'Yönetici'
+
+    @staticmethod
+    def _save(profile_id: str, profiler: cProfile.Profile, session: ProfileSession, scope, total: float):
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            stats = pstats.Stats(profiler)
+            stats.dump_stats(PROFILE_DIR / f"{profile_id}.pstats")
+            # Response model validation/encoding plus JSON rendering
+            serialization = sum(
+                entry[3] for (filename, _, funcname), entry in stats.stats.items()
+                if (funcname == "serialize_response" and filename.endswith("fastapi/routing.py"))
+                or (funcname == "render" and filename.endswith("starlette/responses.py"))
+            )
+            (PROFILE_DIR / f"{profile_id}.json").write_text(json.dumps({
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "total_ms": round(total * 1000, 3),
+                "mongo_ms": round(session.mongo_seconds * 1000, 3),
+                "mongo_commands": session.mongo_commands,
+                "serialization_ms": round(serialization * 1000, 3),
+                "pstats_url": f"/api/profiles/{profile_id}/pstats",
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }))
+            for old in sorted(PROFILE_DIR.glob("*.json"), key=lambda f: f.stat().st_mtime)[:-PROFILE_MAX_FILES]:
+                old.unlink(missing_ok=True)
+                old.with_suffix(".pstats").unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"Profile save error: {str(e)}")
+
+async def mongo_health() -> dict:
+    """Ping Mongo with a short timeout and attach the pool counters"""
+    health = {"mongo": "ok", "latency_ms": None, "max_pool_size": MONGO_MAX_POOL_SIZE, "pools": mongo_pool_stats.snapshot()}
+    if db is None:
+        health["mongo"] = "not_connected"
+        return health
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_TIMEOUT)
+        health["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        health["mongo"] = "unreachable"
+        health["error"] = str(e) or "timeout"
+    return health
+
+# Liveness: reports Mongo and the pool but never fails on them, so a database
+# outage does not get every worker restarted.
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok", **await mongo_health()}
+
+# Readiness: 503 when Mongo is unreachable or this worker's pool is exhausted
+# (every connection checked out and requests queueing for one).
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    health = await mongo_health()
+    # maxPoolSize=0 means no limit, so a pool can never be exhausted
+    exhausted = [
+        address for address, pool in health["pools"].items()
+        if pool["checked_out"] >= MONGO_MAX_POOL_SIZE and pool["waiting"] > 0
+    ] if MONGO_MAX_POOL_SIZE > 0 else []
+    ready = health["mongo"] == "ok" and not exhausted
+    health["status"] = "ready" if ready else "not_ready"
+    if exhausted:
+        health["exhausted_pools"] = exhausted
+    return JSONResponse(health, status_code=200 if ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+# Mount uploads directory for static file serving (created in the lifespan)
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1324,6 +3903,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+async def ensure_indexes():
+    """Create indexes collection by collection; a failure on one does not skip the others"""
+    indexes = {
+        "idempotency_keys": [("created_at", {"expireAfterSeconds": IDEMPOTENCY_TTL})],
+        "pending_payments": [
+            ([("status", 1), ("created_at", 1)], {}),
+            ("order_id", {}),
+            ("payment_id", {"sparse": True}),
+            ("archived_at", {"expireAfterSeconds": PAYMENT_ARCHIVE_RETENTION}),
+        ],
+        "payment_history": [("order_id", {})],
+        "product_reviews": [([("product_id", 1), ("approved", 1), ("created_at", -1), ("id", -1)], {})],
+        "orders": [("id", {})],
+        "payment_callbacks": [
+            ([("status", 1), ("available_at", 1)], {}),
+            ("done_at", {"expireAfterSeconds": PAYMENT_CALLBACK_RETENTION}),
+        ],
+        "tombstones": [
+            ([("collection", 1), ("deleted_at", 1), ("id", 1)], {}),
+            ("created_at", {"expireAfterSeconds": SYNC_TOMBSTONE_RETENTION}),
+        ],
+    }
+    for collection in SYNC_COLLECTIONS:
+        indexes.setdefault(collection, []).append(([("updated_at", 1), ("id", 1)], {}))
+    for collection, specs in indexes.items():
+        try:
+            for keys, options in specs:
+                await db[collection].create_index(keys, **options)
+        except PyMongoError as e:
+            logger.warning(f"Index creation error on {collection}: {str(e)}")
+    try:
+        await db.orders.create_index("order_code", unique=True, partialFilterExpression={"order_code": {"$type": "string"}})
+    except PyMongoError as e:
+        # Fails while old duplicate codes exist; lookups still work, collisions are just not caught
+        logger.error(f"Unique order_code index could not be created, resolve duplicate order codes: {str(e)}")
+
+async def backfill_updated_at():
+    """Stamp documents written before delta sync existed so they enter the stream once"""
+    stamp = sync_timestamp()
+    for collection in SYNC_COLLECTIONS:
+        try:
+            await db[collection].update_many({"updated_at": {"$exists": False}}, {"$set": {"updated_at": stamp}})
+        except PyMongoError as e:
+            logger.warning(f"updated_at backfill error on {collection}: {str(e)}")
+
+async def prepare_database():
+    """Index creation and backfills, once Mongo answers"""
+    while True:
+        try:
+            await db.command("ping")
+            break
+        except PyMongoError as e:
+            logger.warning(f"MongoDB not reachable, index creation postponed: {str(e)}")
+            await asyncio.sleep(5)
+    await ensure_indexes()
+    await backfill_updated_at()
+
+database_setup: Optional[asyncio.Task] = None
+
+async def start_background_services():
+    global database_setup
+    # Runs in the background: with Mongo down every call would wait out the
+    # server selection timeout while the worker accepts no connections
+    database_setup = asyncio.create_task(prepare_database())
+    await cache_invalidator.start(db)
+    await live_events.start(db)
+    await settings_service.start(db)
+    await catalog_snapshot.start(db)
+    payment_sweeper.start()
+    payment_reconciler.start()
+    payment_callback_queue.start()
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if database_setup is not None and not database_setup.done():
+        database_setup.cancel()
+        try:
+            await database_setup
+        except asyncio.CancelledError:
+            pass
+    await payment_callback_queue.stop()
+    await payment_reconciler.stop()
+    await payment_sweeper.stop()
+    await settings_service.stop()
+    await catalog_snapshot.stop()
+    await close_payment_http()
+    await live_events.stop()
+    await cache_invalidator.stop()
+    if client is not None:
+        client.close()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(os.getpid())
\ No newline at end of file
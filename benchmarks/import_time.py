@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Herbalife E-commerce - Cold start benchmark
+
+Imports backend/server.py in fresh interpreters (what an autoscaled container
+pays before it can serve) and reports the wall time, plus what the import left
+behind: a Mongo client, monitor threads, the payment HTTP stack.
+
+    python benchmarks/import_time.py --runs 20
+    python benchmarks/import_time.py --runs 20 --output import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+PROBE = """
+import json, sys, threading, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "mongo_client_created": server.client is not None,
+    "threads": threading.active_count(),
+    "httpx_loaded": "httpx" in sys.modules,
+}))
+"""
+
+
+def run_once() -> dict:
+    env = {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+           "DB_NAME": os.environ.get("DB_NAME", "import_time")}
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold import of server.py")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="Write the results JSON here")
+    args = parser.parse_args()
+
+    run_once()  # Warm the filesystem and bytecode caches
+    samples = [run_once() for _ in range(args.runs)]
+    times = sorted(s["seconds"] * 1000 for s in samples)
+    result = {
+        "runs": args.runs,
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(times[0], 1),
+        "max_ms": round(times[-1], 1),
+        "mongo_client_created": samples[-1]["mongo_client_created"],
+        "threads": samples[-1]["threads"],
+        "httpx_loaded": samples[-1]["httpx_loaded"],
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Herbalife E-commerce - Load test for the storefront and checkout
+
+Seeds a local MongoDB with a realistic catalog, then drives weighted scenarios
+at a fixed concurrency and reports throughput and p50/p95/p99 per route.
+
+    # In-process (ASGI transport, no network hop)
+    python benchmarks/load_test.py --concurrency 20 --duration 30
+
+    # Through uvicorn with several workers
+    python benchmarks/load_test.py --mode uvicorn --workers 4
+
+    # Save a baseline, later compare against it (exit code 1 on regression)
+    python benchmarks/load_test.py --save-baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --baseline benchmarks/baseline.json
+
+MONGO_URL defaults to mongodb://localhost:27017 and the benchmark database
+(--db, default herbalife_bench) is dropped and re-seeded on every run.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+
+SCENARIOS = {
+    "browse_products": 40,
+    "view_product": 25,
+    "track_order": 20,
+    "create_order": 10,
+    "admin_list_orders": 5,
+}
+
+ADMIN_EMAIL = "bench@herbalife.com"
+CATEGORIES = ["Protein", "Shake", "Vitamin", "Çay", "Paket"]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def seed(database, products: int, reviews_per_product: int, orders: int):
+    """Drop and fill the benchmark database, return ids the scenarios use"""
+    await database.client.drop_database(database.name)
+    now = datetime.now(timezone.utc)
+    rng = random.Random(42)
+
+    product_docs = []
+    for i in range(products):
+        has_variants = i % 3 == 0
+        product_docs.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Bench Product {i}",
+            "description": "Günlük beslenme desteği. " * 20,
+            "price": round(rng.uniform(150, 3500), 2),
+            "image_url": f"https://cdn.example.com/products/{i}.jpg",
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "stock": rng.randint(0, 500),
+            "is_package": i % 10 == 0,
+            "has_variants": has_variants,
+            "variants": [
+                {"name": flavor, "stock": rng.randint(0, 100), "image_url": None, "is_available": True}
+                for flavor in ["Vanilya", "Çikolata", "Çilek", "Muz"]
+            ] if has_variants else [],
+            "display_order": i if i % 4 == 0 else 0,
+            "is_campaign": i % 7 == 0,
+            "campaign_text": "%20 indirim" if i % 7 == 0 else None,
+            "created_at": (now - timedelta(days=i)).isoformat()
+        })
+    await database.products.insert_many(product_docs)
+
+    review_docs = [
+        {
+            "id": str(uuid.uuid4()),
+            "product_id": product["id"],
+            "customer_name": f"Müşteri {j}",
+            "rating": rng.randint(3, 5),
+            "comment": "Üründen çok memnun kaldım, tavsiye ederim. " * 3,
+            "image_url": None,
+            "approved": j % 5 != 0,
+            "created_at": (now - timedelta(hours=j)).isoformat()
+        }
+        for product in product_docs for j in range(reviews_per_product)
+    ]
+    if review_docs:
+        await database.product_reviews.insert_many(review_docs)
+
+    order_docs = []
+    for i in range(orders):
+        items = [
+            {"product_id": p["id"], "product_name": p["name"], "quantity": rng.randint(1, 3), "price": p["price"], "variant": None}
+            for p in rng.sample(product_docs, k=min(len(product_docs), rng.randint(1, 4)))
+        ]
+        order_docs.append({
+            "id": str(uuid.uuid4()),
+            "order_code": f"HRB-{i:06X}",  # Unique, and valid in the legacy format
+            "customer_name": f"Müşteri {i}",
+            "customer_email": f"customer{i}@example.com",
+            "customer_phone": "+90 555 000 00 00",
+            "customer_address": "Atatürk Cad. No:1 İstanbul",
+            "receipt_file_url": None,
+            "items": items,
+            "total_amount": round(sum(item["price"] * item["quantity"] for item in items), 2),
+            "status": rng.choice(["pending", "confirmed", "shipped", "delivered"]),
+            "created_at": (now - timedelta(minutes=i)).isoformat()
+        })
+    if order_docs:
+        await database.orders.insert_many(order_docs)
+
+    await database.admins.insert_one({
+        "id": str(uuid.uuid4()), "email": ADMIN_EMAIL, "password_hash": "-", "role": "Yönetici",
+        "created_at": now.isoformat()
+    })
+    return {
+        "products": product_docs,
+        "order_codes": [o["order_code"] for o in order_docs],
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, route: str, seconds: float, ok: bool):
+        self.samples.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            samples.sort()
+            routes[route] = {
+                "requests": len(samples),
+                "errors": self.errors.get(route, 0),
+                "rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "p50_ms": round(percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            }
+        total = sum(r["requests"] for r in routes.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "routes": routes,
+        }
+
+
+class Scenarios:
+    """Each scenario is one user action made of one or more requests"""
+
+    def __init__(self, http, data: dict, admin_token: str, recorder: Recorder):
+        self.http = http
+        self.data = data
+        self.admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        self.recorder = recorder
+        self.created_codes = []
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.recorder.add(route, time.perf_counter() - start, ok)
+        return response
+
+    async def browse_products(self, rng):
+        await self.request("GET /api/products", "GET", "/api/products")
+
+    async def view_product(self, rng):
+        product = rng.choice(self.data["products"])
+        await self.request("GET /api/products/{product_id}", "GET", f"/api/products/{product['id']}")
+        await self.request("GET /api/reviews/{product_id}", "GET", f"/api/reviews/{product['id']}")
+
+    async def track_order(self, rng):
+        code = rng.choice(self.created_codes or self.data["order_codes"])
+        await self.request("GET /api/orders/{order_id}", "GET", f"/api/orders/{code}")
+
+    async def create_order(self, rng):
+        products = rng.sample(self.data["products"], k=min(3, len(self.data["products"])))
+        items = [
+            {"product_id": p["id"], "product_name": p["name"], "quantity": 1, "price": p["price"]}
+            for p in products
+        ]
+        response = await self.request("POST /api/orders", "POST", "/api/orders", json={
+            "customer_name": "Bench Customer",
+            "customer_email": "bench_customer@example.com",
+            "customer_phone": "+90 555 000 00 00",
+            "customer_address": "Bench Address",
+            "items": items,
+            "total_amount": sum(item["price"] for item in items)
+        })
+        if response is not None and response.status_code == 201:
+            self.created_codes.append(response.json()["order_code"])
+
+    async def admin_list_orders(self, rng):
+        await self.request("GET /api/orders", "GET", "/api/orders", headers=self.admin_headers)
+
+
+async def drive(scenarios: Scenarios, concurrency: int, duration: float, warmup: float, seed_value: int) -> dict:
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name] for name in names]
+
+    async def user(worker: int, until: float):
+        rng = random.Random(seed_value + worker)
+        while time.perf_counter() < until:
+            await getattr(scenarios, rng.choices(names, weights)[0])(rng)
+
+    if warmup > 0:
+        until = time.perf_counter() + warmup
+        await asyncio.gather(*(user(w, until) for w in range(concurrency)))
+        scenarios.recorder = Recorder()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(w, start + duration) for w in range(concurrency)))
+    return scenarios.recorder.report(time.perf_counter() - start)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(http, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await http.get("/api/products")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not come up")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Routes whose p95 grew or throughput dropped by more than the tolerance"""
+    regressions = []
+    for route, current in result["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if before["rps"] and current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{route}: rps {before['rps']} -> {current['rps']}")
+    return regressions
+
+
+def print_report(result: dict):
+    print(f"\n{'Route':<36}{'req':>8}{'err':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for route, r in result["routes"].items():
+        print(f"{route:<36}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    print(f"\nTotal: {result['requests']} requests, {result['errors']} errors, {result['rps']} req/s")
+
+
+async def main(args) -> int:
+    # server.py reads its configuration at import time
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    os.environ['DB_NAME'] = args.db
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    os.environ.setdefault('CACHE_INVALIDATION_MODE', 'off')
+    sys.path.insert(0, str(BACKEND_DIR))
+    import httpx
+    import server
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    database = server.connect_mongo()
+    data = await seed(database, args.products, args.reviews, args.orders)
+    token = server.create_token(ADMIN_EMAIL, "Yönetici")
+    print(f"Seeded {args.products} products, {args.products * args.reviews} reviews, {args.orders} orders into {args.db}")
+
+    process = None
+    if args.mode == "uvicorn":
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=os.environ.copy()
+        )
+        http = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30,
+                                 limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        lifespan = server.app.router.lifespan_context(server.app)
+        await lifespan.__aenter__()
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=30)
+
+    try:
+        if process:
+            await wait_until_up(http)
+        scenarios = Scenarios(http, data, token, Recorder())
+        result = await drive(scenarios, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        await http.aclose()
+        if process:
+            process.terminate()
+            process.wait()
+        else:
+            await lifespan.__aexit__(None, None, None)
+
+    result = {
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "uvicorn" else 1,
+        "concurrency": args.concurrency,
+        "dataset": {"products": args.products, "reviews_per_product": args.reviews, "orders": args.orders},
+        "python": platform.python_version(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **result,
+    }
+    print_report(result)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2))
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the storefront and checkout")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run")
+    parser.add_argument("--db", default="herbalife_bench", help="Database to drop and seed")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--reviews", type=int, default=10, help="Reviews per product")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p95/rps change (0.15 = 15%%)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
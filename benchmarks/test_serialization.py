@@ -0,0 +1,182 @@
+"""
+Herbalife E-commerce - Serialization microbenchmarks
+
+Times validating and dumping the response models at realistic sizes, using the
+exact FastAPI `response_model` path next to the alternatives. Runs offline
+(no MongoDB needed):
+
+    pytest benchmarks/test_serialization.py
+    pytest benchmarks/test_serialization.py --benchmark-save=baseline
+    pytest benchmarks/test_serialization.py --benchmark-compare
+
+Attach the table to any change that touches serialization in server.py.
+"""
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import List
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'test_serialization')
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from pydantic import TypeAdapter
+
+import server
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_products(count: int = 200) -> list:
+    return [{
+        "id": str(uuid.uuid4()),
+        "name": f"Formül 1 Besleyici Shake {i}",
+        "description": "Günlük beslenme desteği, protein ve vitamin içerir. " * 10,
+        "price": 1249.90 + i,
+        "image_url": f"https://cdn.example.com/products/{i}.jpg",
+        "category": "Shake",
+        "stock": 120,
+        "is_package": i % 10 == 0,
+        "has_variants": True,
+        "variants": [
+            {"name": flavor, "stock": 30, "image_url": f"https://cdn.example.com/products/{i}-{flavor}.jpg", "is_available": True}
+            for flavor in ["Vanilya", "Çikolata", "Çilek", "Muz", "Kurabiye"]
+        ],
+        "display_order": i,
+        "is_campaign": i % 5 == 0,
+        "campaign_text": "%20 indirim" if i % 5 == 0 else None,
+        "created_at": NOW - timedelta(days=i)
+    } for i in range(count)]
+
+
+def make_orders(count: int = 200) -> list:
+    return [{
+        "id": str(uuid.uuid4()),
+        "order_code": f"HRB-{i:06X}",
+        "customer_name": "Ayşe Yılmaz",
+        "customer_email": f"customer{i}@example.com",
+        "customer_phone": "+90 555 000 00 00",
+        "customer_address": "Atatürk Cad. No:1 Daire:5 Kadıköy / İstanbul",
+        "receipt_file_url": None,
+        "items": [
+            {"product_id": str(uuid.uuid4()), "product_name": f"Ürün {j}", "quantity": 2, "price": 899.5, "variant": "Vanilya"}
+            for j in range(6)
+        ],
+        "total_amount": 10794.0,
+        "status": "pending",
+        "created_at": NOW - timedelta(minutes=i)
+    } for i in range(count)]
+
+
+def make_banners(count: int = 20) -> list:
+    return [{
+        "id": str(uuid.uuid4()),
+        "title": f"Kampanya {i}",
+        "description": "Yaz kampanyası başladı",
+        "image_url": f"https://cdn.example.com/banners/{i}.jpg",
+        "link_url": "/urunler",
+        "active": True,
+        "is_blog": True,
+        "blog_content": "<p>Sağlıklı beslenme için öneriler ve tarifler.</p>" * 100,
+        "blog_images": [f"https://cdn.example.com/blog/{i}-{j}.jpg" for j in range(8)],
+        "created_at": NOW - timedelta(days=i)
+    } for i in range(count)]
+
+
+def make_site_settings() -> dict:
+    legal = "Bu metin satış sözleşmesinin ilgili maddelerini içerir. " * 200
+    return {
+        **server.SiteSettings().model_dump(),
+        "popup_enabled": True,
+        "popup_title": "Hoş geldiniz",
+        "popup_content": "İlk siparişinize özel indirim",
+        "company_address": "Levent, İstanbul",
+        "company_tax_number": "1234567890",
+        "return_policy": legal,
+        "sales_agreement": legal,
+        "privacy_policy": legal,
+        "updated_at": NOW
+    }
+
+
+# name -> (response type, route path, payload factory)
+CASES = {
+    "product": (List[server.Product], "/api/products", make_products),
+    "order": (List[server.Order], "/api/orders", make_orders),
+    "banner": (List[server.Banner], "/api/banners", make_banners),
+    "site_settings": (server.SiteSettings, "/api/site-settings", make_site_settings),
+}
+
+
+def response_field(path: str):
+    for route in server.app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def run_sync(coroutine):
+    """Drive a coroutine that never suspends, without an event loop"""
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+@pytest.fixture(params=list(CASES))
+def case(request):
+    response_type, path, factory = CASES[request.param]
+    if "benchmark" in request.fixturenames:
+        request.getfixturevalue("benchmark").group = request.param
+    return TypeAdapter(response_type), response_field(path), factory()
+
+
+def test_response_model(benchmark, case):
+    """What the routes do today: validate + jsonable_encoder + json.dumps"""
+    _, field, payload = case
+
+    def serialize():
+        content = run_sync(serialize_response(field=field, response_content=payload))
+        return JSONResponse(content).body
+
+    assert benchmark(serialize)
+
+
+def test_type_adapter_dump_json(benchmark, case):
+    """Validate and encode in pydantic-core, skipping jsonable_encoder"""
+    adapter, _, payload = case
+    assert benchmark(lambda: adapter.dump_json(adapter.validate_python(payload)))
+
+
+def test_validate_only(benchmark, case):
+    adapter, _, payload = case
+    assert benchmark(adapter.validate_python, payload)
+
+
+def test_dump_validated_models(benchmark, case):
+    """Encoding cost alone, for handlers that already hold model instances"""
+    adapter, _, payload = case
+    validated = adapter.validate_python(payload)
+    assert benchmark(adapter.dump_json, validated)
+
+
+def test_plain_json_dumps(benchmark, case):
+    """Lower bound: no validation, stdlib encoder"""
+    _, _, payload = case
+    assert benchmark(lambda: json.dumps(payload, default=str).encode())
+
+
+def test_outputs_match(case):
+    """The alternatives must produce the same document as the response_model path"""
+    adapter, field, payload = case
+    expected = json.loads(JSONResponse(run_sync(serialize_response(field=field, response_content=payload))).body)
+    assert json.loads(adapter.dump_json(adapter.validate_python(payload))) == expected
@@ -213,9 +213,10 @@ const Checkout = () => {
       const response = await axios.post(`${API}${endpoint}`, paymentData);
       
       if (response.data.status === 'redirect') {
-        if (provider === 'paytr' && response.data.iframe_token) {
+        // The backend may fail over to the other provider, so follow what it returned
+        if (response.data.iframe_token) {
           setIframeUrl(response.data.redirect_url);
-        } else if (provider === 'iyzico' && response.data.html_content) {
+        } else if (response.data.html_content) {
           setThreeDSContent(response.data.html_content);
         }
       } else if (response.data.status === 'failure') {
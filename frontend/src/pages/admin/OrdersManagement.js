@@ -1,4 +1,4 @@
-import { useEffect, useState, useMemo } from 'react';
+import { useEffect, useState, useMemo, useRef } from 'react';
 import axios from 'axios';
 import { Package, Eye, Search, ChevronLeft, ChevronRight, X, Trash2 } from 'lucide-react';
 import { toast } from 'sonner';
@@ -8,6 +8,9 @@ const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 const ITEMS_PER_PAGE = 15;
+// Reconnect delay for the live order feed (doubles up to the max)
+const FEED_RETRY_MS = 1000;
+const FEED_RETRY_MAX_MS = 30000;
 
 const OrdersManagement = () => {
   const [orders, setOrders] = useState([]);
@@ -20,6 +23,79 @@ const OrdersManagement = () => {
     fetchOrders();
   }, []);
 
+  // Live order feed: apply the server's deltas instead of polling
+  const applyFeedEventRef = useRef(null);
+  applyFeedEventRef.current = (event) => {
+    switch (event.type) {
+      case 'order_created':
+        // The event carries a summary only; refetch for the full order (items, address)
+        toast.success(`Yeni sipariş: ${event.order?.order_code || ''}`);
+        fetchOrders();
+        break;
+      case 'order_status_changed':
+        setOrders((prev) => prev.map((order) =>
+          event.ids.includes(order.id) ? { ...order, status: event.status } : order
+        ));
+        setSelectedOrder((prev) =>
+          prev && event.ids.includes(prev.id) ? { ...prev, status: event.status } : prev
+        );
+        break;
+      case 'order_deleted':
+        setOrders((prev) => prev.filter((order) => !event.ids.includes(order.id)));
+        setSelectedOrder((prev) => (prev && event.ids.includes(prev.id) ? null : prev));
+        break;
+      case 'payment_status_changed': {
+        // order_id is the id or the order code the payment was started with
+        const matches = (order) => order.id === event.order_id || order.order_code === event.order_id;
+        const patch = { payment_status: event.payment_status, ...(event.status ? { status: event.status } : {}) };
+        setOrders((prev) => prev.map((order) => (matches(order) ? { ...order, ...patch } : order)));
+        setSelectedOrder((prev) => (prev && matches(prev) ? { ...prev, ...patch } : prev));
+        break;
+      }
+      default:
+        break; // ping
+    }
+  };
+
+  useEffect(() => {
+    let socket = null;
+    let retryTimer = null;
+    let retryMs = FEED_RETRY_MS;
+    let stopped = false;
+
+    const connect = () => {
+      const token = localStorage.getItem('admin_token');
+      if (!token || !BACKEND_URL) return;
+      socket = new WebSocket(`${BACKEND_URL.replace(/^http/, 'ws')}/api/orders/feed?token=${encodeURIComponent(token)}`);
+      socket.onopen = () => {
+        retryMs = FEED_RETRY_MS;
+      };
+      socket.onmessage = (message) => {
+        try {
+          applyFeedEventRef.current(JSON.parse(message.data));
+        } catch (error) {
+          console.error('Error handling order feed event:', error);
+        }
+      };
+      socket.onclose = (event) => {
+        if (stopped || event.code === 4401) return; // Unmounted or token rejected/expired
+        // Events may have been missed while disconnected
+        retryTimer = setTimeout(() => {
+          fetchOrders();
+          connect();
+        }, retryMs);
+        retryMs = Math.min(retryMs * 2, FEED_RETRY_MAX_MS);
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
+  }, []);
+
   const fetchOrders = async () => {
     try {
       const token = localStorage.getItem('admin_token');
@@ -128,6 +204,17 @@ const OrdersManagement = () => {
     return map[status] || status;
   };
 
+  // Card payment result from the provider; bank transfer orders have none
+  const getPaymentStatusBadge = (paymentStatus) => {
+    if (paymentStatus === 'paid') {
+      return { className: 'bg-green-100 text-green-800', text: 'Ödendi' };
+    }
+    if (paymentStatus === 'failed') {
+      return { className: 'bg-red-100 text-red-800', text: 'Ödeme Başarısız' };
+    }
+    return null;
+  };
+
   const goToPage = (page) => {
     if (page >= 1 && page <= totalPages) {
       setCurrentPage(page);
@@ -268,6 +355,14 @@ const OrdersManagement = () => {
                         <option value="shipped">Kargoda</option>
                         <option value="delivered">Teslim Edildi</option>
                       </select>
+                      {getPaymentStatusBadge(order.payment_status) && (
+                        <span
+                          className={`ml-2 px-2 py-1 rounded-full text-xs font-medium ${getPaymentStatusBadge(order.payment_status).className}`}
+                          data-testid={`order-payment-status-${index}`}
+                        >
+                          {getPaymentStatusBadge(order.payment_status).text}
+                        </span>
+                      )}
                     </td>
                     <td className="py-4 px-6 text-sm text-gray-600">
                       {new Date(order.created_at).toLocaleDateString('tr-TR')}
@@ -419,6 +514,14 @@ const OrdersManagement = () => {
                 <div>
                   <h3 className="font-bold text-gray-900 mb-4">Ödeme Bilgileri</h3>
                   <div className="space-y-2 text-sm">
+                    {getPaymentStatusBadge(selectedOrder.payment_status) && (
+                      <p>
+                        <span className="text-gray-600">Kart Ödemesi:</span>{' '}
+                        <span className={`px-2 py-1 rounded-full text-xs font-medium ${getPaymentStatusBadge(selectedOrder.payment_status).className}`}>
+                          {getPaymentStatusBadge(selectedOrder.payment_status).text}
+                        </span>
+                      </p>
+                    )}
                     {selectedOrder.receipt_file_url && (
                       <div>
                         <span className="text-gray-600">Ödeme Dekontu:</span>
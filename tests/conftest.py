@@ -0,0 +1,49 @@
+"""
+Shared setup for the in-process tests, which import backend/server.py directly.
+Tests that need MongoDB take the `db` fixture (or `mongo_client`/`mongo_hello`)
+and are skipped when nothing answers at MONGO_URL.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017/?directConnection=true')
+os.environ.setdefault('DB_NAME', 'test_herbalife')
+os.environ.setdefault('MONGO_SERVER_SELECTION_TIMEOUT_MS', '2000')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+
+@pytest.fixture(scope="session")
+def mongo_hello() -> dict:
+    """The server's hello reply; checked once, skips every Mongo test when unreachable"""
+    client = MongoClient(os.environ['MONGO_URL'], serverSelectionTimeoutMS=2000)
+    try:
+        return client.admin.command("hello")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def mongo_client(mongo_hello):
+    """A Motor client for one test; it binds to the event loop that first uses it"""
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], serverSelectionTimeoutMS=2000)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def db(mongo_client, monkeypatch):
+    """server.db (and catalog_db) pointed at the test database on this test's client"""
+    import server
+
+    database = mongo_client[os.environ['DB_NAME']]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "catalog_db", database)
+    return database
@@ -0,0 +1,131 @@
+"""
+Herbalife E-commerce API Tests - Bulk Operations
+Tests for: Bulk product import/update (JSON and CSV), bulk order status changes
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+ADMIN_EMAIL = "admin@herbalife.com"
+ADMIN_PASSWORD = "admin123"
+
+
+@pytest.fixture
+def admin_headers():
+    """Get admin authorization headers"""
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": ADMIN_EMAIL,
+        "password": ADMIN_PASSWORD
+    })
+    if response.status_code != 200:
+        pytest.skip("No admin credentials available")
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+class TestProductBulk:
+    """Bulk product create/update/delete via /api/products/bulk"""
+
+    def test_bulk_requires_auth(self):
+        """Test bulk endpoint rejects unauthenticated requests"""
+        response = requests.post(f"{BASE_URL}/api/products/bulk", json=[])
+        assert response.status_code in [401, 403]
+
+    def test_bulk_json_create_update_delete(self, admin_headers):
+        """Test a JSON batch reports a result for every row in order"""
+        rows = [
+            {"action": "create", "name": "TEST_Bulk_A", "description": "Bulk", "price": 10,
+             "image_url": "https://via.placeholder.com/300", "category": "Test"},
+            {"name": "TEST_Bulk_A", "price": 12.5},
+            {"action": "update", "id": "TEST_missing_product", "price": 1},
+            {"action": "create", "name": "TEST_Bulk_Invalid"},
+        ]
+        response = requests.post(f"{BASE_URL}/api/products/bulk", json=rows, headers=admin_headers)
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["total"] == 4
+        statuses = [r["status"] for r in data["results"]]
+        assert statuses == ["created", "updated", "not_found", "error"]
+        product_id = data["results"][0]["id"]
+        assert data["results"][1]["id"] == product_id
+
+        product = requests.get(f"{BASE_URL}/api/products/{product_id}").json()
+        assert product["price"] == 12.5
+        print(f"Bulk results: {statuses}")
+
+        # Cleanup through the same endpoint
+        response = requests.post(f"{BASE_URL}/api/products/bulk", json=[
+            {"action": "delete", "id": product_id}
+        ], headers=admin_headers)
+        assert response.json()["deleted"] == 1
+
+    def test_bulk_rejects_non_object_rows(self, admin_headers):
+        """Test array elements that are not objects fail per row instead of failing the batch"""
+        response = requests.post(f"{BASE_URL}/api/products/bulk", json=[1, "x", None, [1, 2]], headers=admin_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["failed"] == 4
+        assert all(r["status"] == "error" for r in data["results"])
+
+    def test_bulk_csv_upload(self, admin_headers):
+        """Test CSV upload creates and deletes products keyed by name"""
+        create_csv = (
+            "action,name,description,price,image_url,category,stock\n"
+            "create,TEST_Bulk_CSV,From CSV,49.90,https://via.placeholder.com/300,Test,20\n"
+        )
+        response = requests.post(
+            f"{BASE_URL}/api/products/bulk",
+            files={"file": ("products.csv", create_csv, "text/csv")},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 1
+        assert data["results"][0]["status"] == "created"
+
+        delete_csv = "action,name\ndelete,TEST_Bulk_CSV\n"
+        response = requests.post(
+            f"{BASE_URL}/api/products/bulk",
+            data=delete_csv,
+            headers={**admin_headers, "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200
+        assert response.json()["deleted"] == 1
+
+
+class TestOrderBulkStatus:
+    """Bulk order status transitions via /api/orders/bulk-status"""
+
+    def test_bulk_status_by_id_and_code(self, admin_headers):
+        """Test orders can be addressed by id or order code in one batch"""
+        order_data = {
+            "customer_name": "TEST Bulk Customer",
+            "customer_email": "test_bulk@example.com",
+            "customer_phone": "+90 555 000 00 00",
+            "customer_address": "Test Address",
+            "items": [{"product_id": "test", "product_name": "Test", "quantity": 1, "price": 10}],
+            "total_amount": 10
+        }
+        first = requests.post(f"{BASE_URL}/api/orders", json=order_data).json()
+        second = requests.post(f"{BASE_URL}/api/orders", json=order_data).json()
+
+        response = requests.post(f"{BASE_URL}/api/orders/bulk-status", json={
+            "order_ids": [first["id"], second["order_code"], "HRB-NOPE00"],
+            "status": "shipped"
+        }, headers=admin_headers)
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["updated"] == 2
+        assert data["not_found"] == 1
+        assert [r["status"] for r in data["results"]] == ["updated", "updated", "not_found"]
+        assert data["results"][1]["id"] == second["id"]
+
+        order = requests.get(f"{BASE_URL}/api/orders/{second['id']}").json()
+        assert order["status"] == "shipped"
+
+        # Cleanup
+        for order_id in [first["id"], second["id"]]:
+            requests.delete(f"{BASE_URL}/api/orders/{order_id}", headers=admin_headers)
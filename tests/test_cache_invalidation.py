@@ -0,0 +1,134 @@
+"""
+Herbalife E-commerce Tests - Cross-worker cache invalidation
+Runs against a local MongoDB from MONGO_URL. The change stream test needs a
+single-node replica set (`mongod --replSet rs0` followed by `rs.initiate()`).
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+
+async def assert_other_worker_invalidated(mode: str, client):
+    """Write through one invalidator and expect the second one to be notified"""
+    database = client[os.environ['DB_NAME']]
+    writer = server.CacheInvalidator(mode)
+    reader = server.CacheInvalidator(mode)
+    received = asyncio.Queue()
+    reader.subscribe("products", received.put_nowait)
+
+    await writer.start(database)
+    await reader.start(database)
+    product_id = f"TEST_cache_{uuid.uuid4().hex}"
+    try:
+        await asyncio.sleep(0.5)  # Let both listeners attach
+        await database.products.insert_one({"id": product_id, "name": "TEST cache product"})
+        await writer.publish("products")
+        collection = await asyncio.wait_for(received.get(), timeout=5)
+        assert collection == "products"
+        assert reader.active_mode == mode
+    finally:
+        await writer.stop()
+        await reader.stop()
+        await database.products.delete_one({"id": product_id})
+
+
+class TestCacheInvalidation:
+    """Invalidation broadcast between two simulated workers"""
+
+    def test_poll_mode_broadcasts_to_other_worker(self, mongo_client):
+        """Test the capped cache_events fallback (works on a standalone server)"""
+        asyncio.run(assert_other_worker_invalidated("poll", mongo_client))
+
+    def test_change_stream_broadcasts_to_other_worker(self, mongo_client, mongo_hello):
+        """Test change stream invalidation on a replica set"""
+        if 'setName' not in mongo_hello:
+            pytest.skip("Change streams need a replica set")
+        asyncio.run(assert_other_worker_invalidated("change_stream", mongo_client))
+
+    def test_start_survives_unreachable_mongo(self):
+        """Test a worker booting without MongoDB keeps retrying instead of failing to start"""
+        async def run():
+            client = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=100)
+            database = client[os.environ['DB_NAME']]
+            invalidator = server.CacheInvalidator("poll")
+            bus = server.LiveEventBus()
+            try:
+                await invalidator.start(database)
+                await bus.start(database)
+                await asyncio.sleep(0.5)
+                assert not invalidator._task.done()
+                assert not bus._task.done()
+            finally:
+                await invalidator.stop()
+                await bus.stop()
+                client.close()
+
+        asyncio.run(run())
+
+    def test_startup_does_not_wait_for_mongo(self, monkeypatch):
+        """Test index creation, backfills and settings seeding run after startup returns"""
+        monkeypatch.setattr(server, "CATALOG_SNAPSHOT_ENABLED", False)
+        monkeypatch.setattr(server, "client", None)
+        # "auto" probes for change streams once; that bounded wait is not under test
+        monkeypatch.setattr(server.cache_invalidator, "mode", "poll")
+
+        async def run():
+            client = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=500)
+            monkeypatch.setattr(server, "db", client[os.environ['DB_NAME']])
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                await server.start_background_services()
+                return loop.time() - start, server.database_setup.done()
+            finally:
+                await server.shutdown_db_client()
+                client.close()
+
+        elapsed, setup_done = asyncio.run(run())
+        assert elapsed < 0.5
+        assert not setup_done
+
+
+class TestSettingsOutage:
+    """Cached settings outlive a Mongo outage"""
+
+    def test_expired_settings_served_stale(self):
+        """Test reads past the TTL return the last copy without waiting on Mongo"""
+        async def run():
+            client = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=300)
+            service = server.SettingsService(ttl=0)
+            service.db = client[os.environ['DB_NAME']]
+            service.set("site_settings", {"id": "site_settings", "site_name": "TEST stale"})
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                value = await service.get("site_settings")
+                elapsed = loop.time() - start
+                await asyncio.sleep(0.5)  # Let the background retry fail
+                return value, elapsed, service._retrying
+            finally:
+                client.close()
+
+        value, elapsed, retrying = asyncio.run(run())
+        assert value["site_name"] == "TEST stale"
+        assert elapsed < 0.1
+        assert not retrying
+
+    def test_never_loaded_settings_raise(self):
+        """Test a read before anything has loaded still reports the outage"""
+        async def run():
+            client = AsyncIOMotorClient("mongodb://127.0.0.1:1", serverSelectionTimeoutMS=100)
+            service = server.SettingsService()
+            service.db = client[os.environ['DB_NAME']]
+            try:
+                await service.get("site_settings")
+            finally:
+                client.close()
+
+        with pytest.raises(server.PyMongoError):
+            asyncio.run(run())
@@ -1,12 +1,26 @@
 """
 Herbalife E-commerce API Tests
-Tests for: Site Settings, Products with Variants, Out-of-Stock functionality
+Tests for: Site Settings, Products with Variants, Out-of-Stock functionality, Product detail, Delta sync, Order codes
 """
 import pytest
 import requests
 import os
+import time
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+# Must cover the server's SYNC_SETTLE_SECONDS
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 2)) + 0.5
+
+
+@pytest.fixture(scope="module")
+def auth_token():
+    """Admin token shared by every test that writes; skips when no admin can log in"""
+    for email, password in [("admin@herbalife.com", "admin123"), ("test_admin@herbalife.com", "testpass123")]:
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={"email": email, "password": password})
+        if response.status_code == 200:
+            return response.json()["token"]
+    pytest.skip("No admin credentials available")
+
 
 class TestSiteSettings:
     """Site Settings API tests - TopBar and Footer content"""
@@ -128,29 +142,6 @@ class TestAuthentication:
 class TestProductVariantsAvailability:
     """Tests for product variant availability (out-of-stock feature)"""
     
-    @pytest.fixture
-    def auth_token(self):
-        """Get authentication token for admin operations"""
-        # Try existing admin first
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "admin@herbalife.com",
-            "password": "admin123"
-        })
-        
-        if response.status_code == 200:
-            return response.json()["token"]
-        
-        # Try test admin
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test_admin@herbalife.com",
-            "password": "testpass123"
-        })
-        
-        if response.status_code == 200:
-            return response.json()["token"]
-        
-        pytest.skip("No admin credentials available")
-    
     def test_create_product_with_unavailable_variants(self, auth_token):
         """Test creating a product with some variants marked as unavailable"""
         headers = {"Authorization": f"Bearer {auth_token}"}
@@ -277,27 +268,6 @@ class TestProductVariantsAvailability:
 class TestSiteSettingsUpdate:
     """Tests for updating site settings (admin only)"""
     
-    @pytest.fixture
-    def auth_token(self):
-        """Get authentication token for admin operations"""
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "admin@herbalife.com",
-            "password": "admin123"
-        })
-        
-        if response.status_code == 200:
-            return response.json()["token"]
-        
-        response = requests.post(f"{BASE_URL}/api/auth/login", json={
-            "email": "test_admin@herbalife.com",
-            "password": "testpass123"
-        })
-        
-        if response.status_code == 200:
-            return response.json()["token"]
-        
-        pytest.skip("No admin credentials available")
-    
     def test_update_site_settings(self, auth_token):
         """Test updating site settings including topbar and footer"""
         headers = {"Authorization": f"Bearer {auth_token}"}
@@ -338,5 +308,153 @@ class TestSiteSettingsUpdate:
         print("Original settings restored")
 
 
+class TestProductDetail:
+    """Product detail with rating summary and paginated approved reviews"""
+
+    def test_product_detail_not_found(self):
+        """Test unknown products return 404"""
+        response = requests.get(f"{BASE_URL}/api/products/TEST_missing_product/detail")
+        assert response.status_code == 404
+
+    def test_product_detail_reviews_and_moderation(self, auth_token):
+        """Test reviews appear in the detail only after approval and paginate with the cursor"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        product = requests.post(f"{BASE_URL}/api/products", json={
+            "name": "TEST_Detail_Product",
+            "description": "Detail test",
+            "price": 10,
+            "image_url": "https://via.placeholder.com/300",
+            "category": "Test"
+        }, headers=headers).json()
+
+        review_ids = []
+        try:
+            for rating in [5, 4, 3]:
+                review = requests.post(f"{BASE_URL}/api/reviews", json={
+                    "product_id": product["id"],
+                    "customer_name": "TEST Reviewer",
+                    "rating": rating,
+                    "comment": "Detail test review"
+                }).json()
+                review_ids.append(review["id"])
+
+            data = requests.get(f"{BASE_URL}/api/products/{product['id']}/detail").json()
+            assert data["product"]["id"] == product["id"]
+            assert data["rating"]["count"] == 0
+            assert data["reviews"] == []
+
+            # Approving reviews must invalidate the cached detail
+            for review_id in review_ids:
+                requests.put(f"{BASE_URL}/api/reviews/{review_id}", json={"approved": True}, headers=headers)
+            data = requests.get(f"{BASE_URL}/api/products/{product['id']}/detail").json()
+            assert data["rating"]["count"] == 3
+            assert data["rating"]["average"] == 4.0
+            assert data["rating"]["distribution"]["5"] == 1
+
+            first = requests.get(f"{BASE_URL}/api/products/{product['id']}/detail", params={"limit": 2}).json()
+            assert len(first["reviews"]) == 2
+            assert first["next_cursor"]
+            second = requests.get(f"{BASE_URL}/api/products/{product['id']}/detail", params={
+                "limit": 2, "cursor": first["next_cursor"]
+            }).json()
+            assert len(second["reviews"]) == 1
+            assert second["next_cursor"] is None
+            seen = {r["id"] for r in first["reviews"] + second["reviews"]}
+            assert seen == set(review_ids)
+            print(f"Rating summary: {data['rating']}")
+        finally:
+            for review_id in review_ids:
+                requests.delete(f"{BASE_URL}/api/reviews/{review_id}", headers=headers)
+            requests.delete(f"{BASE_URL}/api/products/{product['id']}", headers=headers)
+
+
+class TestDeltaSync:
+    """Incremental list sync with ?since=<cursor>"""
+
+    def sync_all(self, cursor):
+        """Follow next_cursor until has_more is false; return (changes, deleted, cursor)"""
+        changes, deleted = [], []
+        while True:
+            response = requests.get(f"{BASE_URL}/api/products", params={"since": cursor})
+            assert response.status_code == 200
+            page = response.json()
+            changes += page["changes"]
+            deleted += page["deleted"]
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                return changes, deleted, cursor
+
+    def test_invalid_cursor(self):
+        """Test a garbled cursor is rejected"""
+        response = requests.get(f"{BASE_URL}/api/products", params={"since": "not-a-cursor"})
+        assert response.status_code == 400
+
+    def test_quiet_cursor_moves_forward(self):
+        """Test a page without changes still advances the cursor, so it never ages into a 410"""
+        _, _, cursor = self.sync_all("0")
+        time.sleep(SYNC_SETTLE_SECONDS)
+        page = requests.get(f"{BASE_URL}/api/products", params={"since": cursor}).json()
+        if page["changes"] or page["deleted"]:
+            pytest.skip("Products changed during the test")
+        assert page["next_cursor"] != cursor
+
+    def test_products_delta(self, auth_token):
+        """Test updates and deletes after a cursor come back, and nothing else"""
+        headers = {"Authorization": f"Bearer {auth_token}"}
+        _, _, cursor = self.sync_all("0")
+
+        kept = requests.post(f"{BASE_URL}/api/products", json={
+            "name": "TEST_Sync_Kept", "description": "Sync test", "price": 10,
+            "image_url": "https://via.placeholder.com/300", "category": "Test"
+        }, headers=headers).json()
+        removed = requests.post(f"{BASE_URL}/api/products", json={
+            "name": "TEST_Sync_Removed", "description": "Sync test", "price": 10,
+            "image_url": "https://via.placeholder.com/300", "category": "Test"
+        }, headers=headers).json()
+        try:
+            requests.put(f"{BASE_URL}/api/products/{kept['id']}", json={"price": 12}, headers=headers)
+            requests.delete(f"{BASE_URL}/api/products/{removed['id']}", headers=headers)
+            time.sleep(SYNC_SETTLE_SECONDS)
+
+            changes, deleted, cursor = self.sync_all(cursor)
+            assert [p["price"] for p in changes if p["id"] == kept["id"]] == [12]
+            assert removed["id"] in deleted
+            assert removed["id"] not in {p["id"] for p in changes}
+
+            changes, deleted, _ = self.sync_all(cursor)
+            assert kept["id"] not in {p["id"] for p in changes}
+            print(f"Synced {len(changes)} changes, {len(deleted)} deletions since last cursor")
+        finally:
+            requests.delete(f"{BASE_URL}/api/products/{kept['id']}", headers=headers)
+
+
+class TestOrderCodes:
+    """Check-symbol order codes and tracking lookups"""
+
+    def test_order_code_lookup(self):
+        """Test a new order is found by its code in any case and a mistyped code is not"""
+        response = requests.post(f"{BASE_URL}/api/orders", json={
+            "customer_name": "TEST Order Code",
+            "customer_email": "test_order_code@example.com",
+            "customer_phone": "+90 555 000 00 00",
+            "customer_address": "Test address",
+            "items": [{"product_id": "TEST_product", "product_name": "TEST product", "quantity": 1, "price": 10}],
+            "total_amount": 10
+        })
+        assert response.status_code == 201
+        code = response.json()["order_code"]
+        assert code.startswith("HRB-")
+
+        found = requests.get(f"{BASE_URL}/api/orders/{code.lower()}")
+        assert found.status_code == 200
+        assert found.json()["order_code"] == code
+
+        # Change one symbol; the check symbol no longer matches
+        body = code[4:]
+        typo = "HRB-" + ("1" if body[0] != "1" else "2") + body[1:]
+        assert requests.get(f"{BASE_URL}/api/orders/{typo}").status_code == 404
+        print(f"Order code: {code}")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
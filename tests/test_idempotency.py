@@ -0,0 +1,116 @@
+"""
+Herbalife E-commerce Tests - Idempotency-Key handling
+Runs run_idempotent against a local MongoDB from MONGO_URL; the fingerprint
+tests need no database.
+"""
+import asyncio
+import hashlib
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def card_request(**overrides) -> server.CardPaymentRequest:
+    fields = {
+        "order_id": "TEST_idempotency_order", "payment_provider": "iyzico",
+        "customer_name": "TEST Customer", "customer_email": "test_idempotency@example.com",
+        "customer_phone": "+90 555 000 00 00", "customer_address": "Test address", "total_amount": 10,
+        "items": [{"product_id": "TEST_product", "product_name": "TEST product", "quantity": 1, "price": 10}],
+        "card_holder_name": "TEST Customer", "card_number": "5528790000000008",
+        "expire_month": "12", "expire_year": "2030", "cvc": "123",
+    }
+    return server.CardPaymentRequest(**{**fields, **overrides})
+
+
+class Handler:
+    """Counts calls and returns a new order id each time"""
+
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"id": str(uuid.uuid4())}
+
+
+class TestIdempotencyFingerprint:
+    """What is stored to detect key reuse"""
+
+    def test_fingerprint_ignores_card_fields(self):
+        """Test card data does not reach the stored fingerprint"""
+        assert server.idempotency_fingerprint(card_request()) == server.idempotency_fingerprint(
+            card_request(card_number="4111111111111111", cvc="999", expire_year="2031")
+        )
+        assert server.idempotency_fingerprint(card_request()) != server.idempotency_fingerprint(card_request(total_amount=11))
+
+    def test_fingerprint_is_keyed(self, monkeypatch):
+        """Test the fingerprint is not a plain hash of the request"""
+        request = card_request()
+        plain = hashlib.sha256(request.model_dump_json().encode('utf-8')).hexdigest()
+        first = server.idempotency_fingerprint(request)
+        monkeypatch.setattr(server, "IDEMPOTENCY_SECRET", "another-secret")
+        assert first != plain
+        assert server.idempotency_fingerprint(request) != first
+
+
+class TestRunIdempotent:
+    """Replays, key reuse and concurrent retries"""
+
+    def test_replay_returns_stored_response(self, db):
+        """Test a retry with the same key replays the first response without running again"""
+        key = f"TEST_{uuid.uuid4().hex}"
+        handler = Handler()
+
+        async def scenario():
+            first = await server.run_idempotent("test", key, card_request(), handler)
+            second = await server.run_idempotent("test", key, card_request(), handler)
+            await server.db.idempotency_keys.delete_one({"_id": f"test:{key}"})
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        assert handler.calls == 1
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.body == server.JSONResponse(first).body
+
+    def test_key_reused_for_different_request(self, db):
+        """Test reusing a key with a different body is rejected with 422"""
+        key = f"TEST_{uuid.uuid4().hex}"
+        handler = Handler()
+
+        async def scenario():
+            await server.run_idempotent("test", key, card_request(), handler)
+            try:
+                with pytest.raises(HTTPException) as error:
+                    await server.run_idempotent("test", key, card_request(total_amount=99), handler)
+            finally:
+                await server.db.idempotency_keys.delete_one({"_id": f"test:{key}"})
+            return error.value
+
+        error = asyncio.run(scenario())
+        assert error.status_code == 422
+        assert handler.calls == 1
+
+    def test_concurrent_retries_wait_for_first(self, db):
+        """Test retries arriving while the first request runs wait and get its result"""
+        key = f"TEST_{uuid.uuid4().hex}"
+        handler = Handler(delay=0.5)
+
+        async def scenario():
+            try:
+                return await asyncio.gather(*[
+                    server.run_idempotent("test", key, card_request(), handler) for _ in range(3)
+                ])
+            finally:
+                await server.db.idempotency_keys.delete_one({"_id": f"test:{key}"})
+
+        results = asyncio.run(scenario())
+        assert handler.calls == 1
+        original = [r for r in results if isinstance(r, dict)]
+        replays = [r for r in results if not isinstance(r, dict)]
+        assert len(original) == 1 and len(replays) == 2
+        assert all(r.body == server.JSONResponse(original[0]).body for r in replays)
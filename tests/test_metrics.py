@@ -0,0 +1,55 @@
+"""
+Herbalife E-commerce Tests - Prometheus route labels and readiness
+Runs in-process against the route table and a stubbed pool snapshot; no MongoDB needed.
+"""
+import asyncio
+
+import pytest
+
+import server
+
+
+def scope(method: str, path: str) -> dict:
+    return {"type": "http", "method": method, "path": path, "root_path": "", "headers": [], "query_string": b""}
+
+
+class TestRouteTemplate:
+    """Requests are labelled with the route that actually handles them"""
+
+    @pytest.mark.parametrize("method,path,template", [
+        ("POST", "/api/products/bulk", "/api/products/bulk"),
+        ("POST", "/api/orders/bulk-status", "/api/orders/bulk-status"),
+        ("GET", "/api/products/abc", "/api/products/{product_id}"),
+        ("DELETE", "/api/orders/abc", "/api/orders/{order_id}"),
+    ])
+    def test_full_match_wins_over_earlier_partial(self, method, path, template):
+        """Test a route matching path and method beats an earlier path-only match"""
+        assert server.MetricsMiddleware.route_template(scope(method, path)) == template
+
+    def test_method_not_allowed_uses_partial_match(self):
+        """Test a 405 request is labelled with the path-only match, not "unmatched\""""
+        assert server.MetricsMiddleware.route_template(scope("PATCH", "/api/products/abc")) == "/api/products/{product_id}"
+        assert server.MetricsMiddleware.route_template(scope("GET", "/api/nope/nope/nope")) == "unmatched"
+
+
+class TestReadiness:
+    """readyz reports an exhausted connection pool"""
+
+    @pytest.fixture
+    def busy_pool(self, monkeypatch):
+        async def mongo_health():
+            return {"mongo": "ok", "pools": {"localhost:27017": {"checked_out": 5, "waiting": 3}}}
+
+        monkeypatch.setattr(server, "mongo_health", mongo_health)
+
+    def test_exhausted_pool_is_not_ready(self, busy_pool, monkeypatch):
+        """Test a full pool with waiters answers 503"""
+        monkeypatch.setattr(server, "MONGO_MAX_POOL_SIZE", 5)
+        response = asyncio.run(server.readyz())
+        assert response.status_code == 503
+
+    def test_unbounded_pool_is_never_exhausted(self, busy_pool, monkeypatch):
+        """Test MONGO_MAX_POOL_SIZE=0 (no limit) skips the exhaustion check"""
+        monkeypatch.setattr(server, "MONGO_MAX_POOL_SIZE", 0)
+        response = asyncio.run(server.readyz())
+        assert response.status_code == 200
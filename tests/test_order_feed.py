@@ -0,0 +1,95 @@
+"""
+Herbalife E-commerce Tests - Live admin order feed (WebSocket)
+The rejected-token test needs no database; the others look the admin up in a
+local MongoDB from MONGO_URL.
+"""
+import functools
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+from pymongo import MongoClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def admin_email(db):
+    """A throwaway admin; seeded with a blocking client so `db` binds to the socket's loop"""
+    sync_client = MongoClient(os.environ['MONGO_URL'])
+    admins = sync_client[os.environ['DB_NAME']].admins
+    email = f"test_feed_{uuid.uuid4().hex}@example.com"
+    admins.insert_one({"email": email, "role": "Admin"})
+    yield email
+    admins.delete_many({"email": email})
+    sync_client.close()
+
+
+def feed_url(token: str) -> str:
+    return f"/api/orders/feed?token={token}"
+
+
+class TestOrderFeedAuth:
+    """Only a valid admin token opens the feed"""
+
+    @pytest.mark.parametrize("token", ["", "not-a-jwt", jwt.encode({"email": "x@example.com"}, "wrong-secret", algorithm="HS256")])
+    def test_bad_token_closes_with_4401(self, client, token):
+        """Test missing, malformed and wrongly signed tokens are closed before accept"""
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(feed_url(token)):
+                pass
+        assert closed.value.code == 4401
+
+    def test_unknown_admin_closes_with_4401(self, client, admin_email):
+        """Test a well signed token for an admin that no longer exists is refused"""
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(feed_url(server.create_token(f"gone_{admin_email}"))):
+                pass
+        assert closed.value.code == 4401
+
+    def test_closes_when_token_expires(self, client, admin_email):
+        """Test the feed ends with 4401 once the token's exp passes"""
+        token = jwt.encode(
+            {"email": admin_email, "role": "Admin", "exp": datetime.now(timezone.utc) + timedelta(seconds=1)},
+            server.JWT_SECRET, algorithm=server.JWT_ALGORITHM
+        )
+        start = time.monotonic()
+        with client.websocket_connect(feed_url(token)) as feed:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                while True:
+                    feed.receive_json()
+        assert closed.value.code == 4401
+        assert time.monotonic() - start < 5
+
+
+class TestOrderFeedEvents:
+    """Order events reach every connected admin"""
+
+    def test_events_are_delivered(self, client, admin_email):
+        """Test events published on the orders topic arrive on the socket in order"""
+        token = server.create_token(admin_email)
+        with client.websocket_connect(feed_url(token)) as feed:
+            publish = functools.partial(server.publish_order_event, "order_status_changed", ids=["TEST_order"], status="shipped")
+            feed.portal.call(publish)
+            feed.portal.call(functools.partial(server.publish_order_event, "order_deleted", ids=["TEST_order"]))
+            changed, deleted = feed.receive_json(), feed.receive_json()
+        assert changed["type"] == "order_status_changed"
+        assert changed["ids"] == ["TEST_order"] and changed["status"] == "shipped"
+        assert deleted["type"] == "order_deleted" and deleted["ids"] == ["TEST_order"]
+        assert server.live_events.listeners("orders") == 0
+
+    def test_ping_when_idle(self, client, admin_email, monkeypatch):
+        """Test an idle feed sends pings so proxies keep the connection open"""
+        monkeypatch.setattr(server, "ORDER_FEED_PING_INTERVAL", 0.1)
+        with client.websocket_connect(feed_url(server.create_token(admin_email))) as feed:
+            assert feed.receive_json() == {"type": "ping"}
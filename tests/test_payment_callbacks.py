@@ -0,0 +1,209 @@
+"""
+Herbalife E-commerce Tests - Provider callbacks: verify, enqueue, acknowledge, apply
+The signature tests need no database; the queue tests run against a local
+MongoDB from MONGO_URL.
+"""
+import asyncio
+import hashlib
+import hmac
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+SECRET_KEY = "TEST_iyzico_secret"
+
+
+def signed_callback(payment_id: str, order_id: str, status: str = "success") -> dict:
+    payload = {
+        "paymentId": payment_id, "conversationId": order_id, "conversationData": "",
+        "mdStatus": "1", "status": status,
+    }
+    message = ":".join(payload[f] for f in ['conversationData', 'conversationId', 'mdStatus', 'paymentId', 'status'])
+    payload["signature"] = hmac.new(SECRET_KEY.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+    return payload
+
+
+@pytest.fixture(autouse=True)
+def payment_settings(monkeypatch):
+    async def get_settings(name):
+        return {"iyzico_api_key": "TEST_key", "iyzico_secret_key": SECRET_KEY}
+
+    monkeypatch.setattr(server.settings_service, "get", get_settings)
+
+
+def run_with_http(scenario):
+    """Run `scenario(http)` with an in-process HTTP client on a fresh loop"""
+    async def wrapper():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as http:
+            return await scenario(http)
+    return asyncio.run(wrapper())
+
+
+async def seed_payment(order_id: str, payment_id: str):
+    await server.db.orders.insert_one({
+        "id": order_id, "order_code": f"TEST-{order_id}", "customer_name": "TEST Customer",
+        "status": "pending", "total_amount": 10, "items": [],
+    })
+    await server.db.pending_payments.insert_one({
+        "order_id": order_id, "provider": "iyzico", "payment_id": payment_id, "amount": 10,
+        "status": "pending", "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+async def cleanup(order_id: str, payment_id: str):
+    await server.db.orders.delete_many({"id": order_id})
+    await server.db.pending_payments.delete_many({"order_id": order_id})
+    await server.db.payment_history.delete_many({"order_id": order_id})
+    await server.db.payment_callbacks.delete_many({"payload.paymentId": payment_id})
+
+
+class TestIyzicoSignature:
+    """Only signed callbacks are accepted"""
+
+    def test_valid_signature(self):
+        """Test a callback signed with the secret key verifies"""
+        settings = {"iyzico_secret_key": SECRET_KEY}
+        assert server.verify_iyzico_callback(settings, signed_callback("TEST_payment", "TEST_order"))
+
+    @pytest.mark.parametrize("change", [
+        {"signature": None},
+        {"signature": ""},
+        {"signature": "0" * 64},
+        {"status": "failure"},
+    ])
+    def test_missing_or_wrong_signature_is_rejected(self, change):
+        """Test unsigned, mis-signed and tampered callbacks do not verify"""
+        payload = {**signed_callback("TEST_payment", "TEST_order"), **change}
+        payload = {k: v for k, v in payload.items() if v is not None}
+        assert not server.verify_iyzico_callback({"iyzico_secret_key": SECRET_KEY}, payload)
+
+    def test_unsigned_callback_returns_400(self):
+        """Test the endpoint refuses an unsigned callback before queueing it"""
+        payload = signed_callback("TEST_payment", "TEST_order")
+        del payload["signature"]
+        response = TestClient(server.app).post("/api/card-payment/iyzico-callback", data=payload)
+        assert response.status_code == 400
+
+
+class TestCallbackQueue:
+    """A verified callback is stored, acknowledged and applied once"""
+
+    def test_verify_enqueue_ack_and_apply(self, db):
+        """Test the callback is acknowledged at once and the worker marks the order paid"""
+        order_id, payment_id = f"TEST_{uuid.uuid4().hex}", f"TEST_{uuid.uuid4().hex}"
+
+        async def scenario(http):
+            await seed_payment(order_id, payment_id)
+            try:
+                response = await http.post("/api/card-payment/iyzico-callback", data=signed_callback(payment_id, order_id))
+                queued = await server.db.payment_callbacks.find_one({"payload.paymentId": payment_id})
+                payment_before = await server.db.pending_payments.find_one({"payment_id": payment_id})
+                job = await server.payment_callback_queue._claim()
+                await server.payment_callback_queue._run(job)
+                return (
+                    response, queued, payment_before,
+                    await server.db.payment_callbacks.find_one({"_id": queued["_id"]}),
+                    await server.db.pending_payments.find_one({"payment_id": payment_id}),
+                    await server.db.orders.find_one({"id": order_id}),
+                )
+            finally:
+                await cleanup(order_id, payment_id)
+
+        response, queued, payment_before, job, payment, order = run_with_http(scenario)
+        assert response.status_code == 200
+        assert response.json() == {"status": "success"}
+        assert queued["status"] == "queued"
+        assert payment_before["status"] == "pending"
+        assert job["status"] == "done"
+        assert payment["status"] == "success"
+        assert order["payment_status"] == "paid"
+        assert order["status"] == "confirmed"
+
+    def test_duplicate_callback_is_applied_once(self, db):
+        """Test a redelivered callback is queued once and reprocessing it changes nothing"""
+        order_id, payment_id = f"TEST_{uuid.uuid4().hex}", f"TEST_{uuid.uuid4().hex}"
+        payload = signed_callback(payment_id, order_id)
+
+        async def scenario(http):
+            await seed_payment(order_id, payment_id)
+            events = server.live_events.subscribe("orders")
+            try:
+                responses = [await http.post("/api/card-payment/iyzico-callback", data=payload) for _ in range(2)]
+                jobs = await server.db.payment_callbacks.count_documents({"payload.paymentId": payment_id})
+                for _ in range(2):
+                    await server.PaymentCallbackQueue.process("iyzico", payload)
+                return (
+                    responses, jobs, events.qsize(),
+                    await server.db.payment_history.count_documents({"order_id": order_id}),
+                    await server.db.orders.find_one({"id": order_id}),
+                )
+            finally:
+                server.live_events.unsubscribe("orders", events)
+                await cleanup(order_id, payment_id)
+
+        responses, jobs, published, history, order = run_with_http(scenario)
+        assert [r.status_code for r in responses] == [200, 200]
+        assert jobs == 1
+        assert published == 1
+        assert history == 1
+        assert order["payment_status"] == "paid"
+
+    def test_retry_finishes_half_applied_payment(self, db, monkeypatch):
+        """Test a job that failed after the status update still updates the order on retry"""
+        order_id, payment_id = f"TEST_{uuid.uuid4().hex}", f"TEST_{uuid.uuid4().hex}"
+        publish = server.publish_order_event
+        failures = []
+
+        async def publish_failing_once(event_type, **data):
+            if not failures:
+                failures.append(event_type)
+                raise RuntimeError("live event bus down")
+            await publish(event_type, **data)
+
+        monkeypatch.setattr(server, "publish_order_event", publish_failing_once)
+
+        async def scenario(http):
+            await seed_payment(order_id, payment_id)
+            events = server.live_events.subscribe("orders")
+            try:
+                await http.post("/api/card-payment/iyzico-callback", data=signed_callback(payment_id, order_id))
+                job = await server.payment_callback_queue._claim()
+                await server.payment_callback_queue._run(job)
+                after_failure = await server.db.payment_callbacks.find_one({"_id": job["_id"]})
+                # Retry now instead of waiting out the backoff
+                await server.payment_callback_queue._run(after_failure)
+                return (
+                    after_failure, [events.get_nowait() for _ in range(events.qsize())],
+                    await server.db.payment_callbacks.find_one({"_id": job["_id"]}),
+                    await server.db.pending_payments.find_one({"payment_id": payment_id}),
+                    await server.db.orders.find_one({"id": order_id}),
+                )
+            finally:
+                server.live_events.unsubscribe("orders", events)
+                await cleanup(order_id, payment_id)
+
+        after_failure, published, job, payment, order = run_with_http(scenario)
+        assert failures == ["payment_status_changed"]
+        assert after_failure["status"] == "queued"
+        assert job["status"] == "done"
+        assert payment["status"] == "success" and "applied_at" in payment
+        assert order["payment_status"] == "paid"
+        assert order["status"] == "confirmed"
+        assert [(e["type"], e["payment_status"], e.get("status")) for e in published] == [
+            ("payment_status_changed", "paid", "confirmed")
+        ]
+
+
+class TestPaymentEvents:
+    """The SSE stream a checkout page follows after the callback"""
+
+    def test_no_subscription_until_streamed(self):
+        """Test a client that disconnects before the stream starts leaves no queue behind"""
+        response = asyncio.run(server.payment_events("TEST_unstreamed_order"))
+        assert response.media_type == "text/event-stream"
+        assert server.live_events.listeners("payment:TEST_unstreamed_order") == 0
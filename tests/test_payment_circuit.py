@@ -0,0 +1,172 @@
+"""
+Herbalife E-commerce Tests - Payment provider circuit breaker and failover
+Iyzico and PayTR are replaced by local stubs that can be told to fail or hang.
+The breaker tests need no database; the failover test stores a pending payment
+and runs against a local MongoDB from MONGO_URL.
+"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import server
+
+
+class ProviderStub:
+    """Local provider that answers `mode`: ok, error (HTTP 500) or hang"""
+
+    def __init__(self, success_body: dict):
+        self.mode = "ok"
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.requests += 1
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if stub.mode == "hang":
+                    time.sleep(2)
+                status, body = (500, {}) if stub.mode == "error" else (200, success_body)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def paytr(monkeypatch):
+    stub = ProviderStub({"status": "success", "token": "TEST_token"})
+    monkeypatch.setattr(server, "PAYTR_BASE_URL", stub.url)
+    monkeypatch.setitem(server.payment_breakers, "paytr", server.CircuitBreaker("paytr", min_calls=3, open_seconds=0.5))
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def iyzico(monkeypatch):
+    stub = ProviderStub({"status": "success", "paymentId": "TEST_payment", "threeDSHtmlContent": "PGh0bWw+"})
+    monkeypatch.setattr(server, "IYZICO_BASE_URL", stub.url)
+    monkeypatch.setitem(server.payment_breakers, "iyzico", server.CircuitBreaker("iyzico", min_calls=3, open_seconds=0.5))
+    yield stub
+    stub.close()
+
+
+def run(coroutine_factory):
+    """Run on a fresh loop; the shared payment client is bound to the loop that made it"""
+    async def wrapper():
+        try:
+            return await coroutine_factory()
+        finally:
+            await server.close_payment_http()
+    return asyncio.run(wrapper())
+
+
+async def status_call():
+    return await server.post_to_provider("paytr", "status", f"{server.PAYTR_BASE_URL}/odeme/durum-sorgu", data={})
+
+
+def circuit_state(provider: str) -> float:
+    return server.REGISTRY.get_sample_value("payment_circuit_state", {"provider": provider})
+
+
+class TestPaymentCircuitBreaker:
+    """Breaker opens on provider errors and stops calling it"""
+
+    def test_opens_after_errors_and_rejects_without_calling(self, paytr):
+        """Test the circuit opens after repeated 5xx and fails fast while open"""
+        paytr.mode = "error"
+
+        async def scenario():
+            for _ in range(3):
+                with pytest.raises(server.PaymentProviderUnavailable):
+                    await status_call()
+            seen = paytr.requests
+            with pytest.raises(server.PaymentProviderUnavailable):
+                await status_call()
+            return seen
+
+        seen = run(scenario)
+        assert paytr.requests == seen == 3
+        assert server.payment_breakers["paytr"].state == "open"
+        assert circuit_state("paytr") == 2
+
+    def test_probe_closes_after_recovery(self, paytr):
+        """Test one successful probe after the cool-down closes the circuit"""
+        paytr.mode = "error"
+
+        async def scenario():
+            for _ in range(3):
+                with pytest.raises(server.PaymentProviderUnavailable):
+                    await status_call()
+            paytr.mode = "ok"
+            await asyncio.sleep(0.6)
+            return await status_call()
+
+        assert run(scenario).status_code == 200
+        assert server.payment_breakers["paytr"].state == "closed"
+        assert circuit_state("paytr") == 0
+
+    def test_read_timeout_budget(self, paytr, monkeypatch):
+        """Test a hanging provider is abandoned after the read timeout, not 30s"""
+        monkeypatch.setitem(server.PAYMENT_READ_TIMEOUTS, "status", 0.3)
+        paytr.mode = "hang"
+        start = time.perf_counter()
+        with pytest.raises(server.PaymentProviderUnavailable):
+            run(status_call)
+        elapsed = time.perf_counter() - start
+        assert elapsed < 1.5
+        print(f"Hanging provider abandoned after {elapsed:.2f}s")
+
+
+class TestPaymentFailover:
+    """With card_payment_provider "both", init moves to the other provider"""
+
+    def test_iyzico_down_fails_over_to_paytr(self, iyzico, paytr, db, monkeypatch):
+        """Test an Iyzico outage returns a PayTR payment form instead of an error"""
+        settings = {
+            "card_payment_enabled": True,
+            "card_payment_provider": "both",
+            "iyzico_api_key": "TEST_key", "iyzico_secret_key": "TEST_secret",
+            "paytr_merchant_id": "TEST_merchant", "paytr_merchant_key": "TEST_key", "paytr_merchant_salt": "TEST_salt",
+        }
+
+        async def get_settings(name):
+            return settings
+
+        monkeypatch.setattr(server.settings_service, "get", get_settings)
+        iyzico.mode = "error"
+        request = server.CardPaymentRequest(
+            order_id="TEST_failover_order", payment_provider="iyzico",
+            customer_name="TEST Customer", customer_email="test_failover@example.com",
+            customer_phone="+90 555 000 00 00", customer_address="Test address", total_amount=10,
+            items=[{"product_id": "TEST_product", "product_name": "TEST product", "quantity": 1, "price": 10}],
+            card_holder_name="TEST Customer", card_number="5528790000000008", expire_month="12", expire_year="2030", cvc="123"
+        )
+
+        async def scenario():
+            try:
+                return await server.start_card_payment("iyzico", request)
+            finally:
+                await db.pending_payments.delete_many({"order_id": request.order_id})
+
+        result = run(scenario)
+        assert result.status == "redirect"
+        assert result.provider == "paytr"
+        assert result.redirect_url.startswith(paytr.url)
+        assert iyzico.requests == 1
@@ -0,0 +1,109 @@
+"""
+Herbalife E-commerce Tests - Rate limiting of public write endpoints
+Runs in-process against the token bucket limiter; no MongoDB needed.
+"""
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """A tiny app with two limited routes sharing the server's dependency"""
+    limiter = server.TokenBucketLimiter({
+        "create_order": {"rate": 60, "per": 60, "burst": 2},
+        "create_review": {"rate": 60, "per": 60, "burst": 2},
+    })
+    monkeypatch.setattr(server, "rate_limiter", limiter)
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    app = FastAPI()
+
+    @app.post("/orders", dependencies=[Depends(server.rate_limit("create_order"))])
+    async def orders():
+        return {"ok": True}
+
+    @app.post("/reviews", dependencies=[Depends(server.rate_limit("create_review"))])
+    async def reviews():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+class TestTokenBucket:
+    """Bucket arithmetic"""
+
+    def test_refill_after_wait(self, clock):
+        """Test an empty bucket refills at rate/per and never above burst"""
+        limiter = server.TokenBucketLimiter({"create_order": {"rate": 6, "per": 60, "burst": 2}})
+        assert limiter.acquire("create_order", "1.1.1.1") == 0
+        assert limiter.acquire("create_order", "1.1.1.1") == 0
+        assert limiter.acquire("create_order", "1.1.1.1") == pytest.approx(10)
+
+        clock.now += 10
+        assert limiter.acquire("create_order", "1.1.1.1") == 0
+        assert limiter.acquire("create_order", "1.1.1.1") > 0
+
+        clock.now += 3600
+        assert limiter.acquire("create_order", "1.1.1.1") == 0
+        assert limiter.acquire("create_order", "1.1.1.1") == 0
+        assert limiter.acquire("create_order", "1.1.1.1") > 0
+
+
+class TestRateLimitDependency:
+    """429 responses on the routes"""
+
+    def test_429_with_retry_after(self, client, clock):
+        """Test the request after the burst gets 429 and a whole-second Retry-After"""
+        assert client.post("/orders").status_code == 200
+        assert client.post("/orders").status_code == 200
+        response = client.post("/orders")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    def test_routes_and_clients_are_isolated(self, client, clock):
+        """Test an exhausted route does not limit another route or another client"""
+        for _ in range(2):
+            client.post("/orders")
+        assert client.post("/orders").status_code == 429
+        assert client.post("/reviews").status_code == 200
+        assert client.post("/orders", headers={"X-Forwarded-For": "203.0.113.9"}).status_code == 200
+
+
+class TestRateLimitConfig:
+    """RATE_LIMITS environment overrides"""
+
+    def test_partial_override_keeps_other_fields(self):
+        """Test overriding only `rate` keeps the default per and burst"""
+        limits = server.load_rate_limits('{"create_order": {"rate": 20}}')
+        assert limits["create_order"] == {**server.DEFAULT_RATE_LIMITS["create_order"], "rate": 20}
+        assert limits["create_review"] == server.DEFAULT_RATE_LIMITS["create_review"]
+
+    @pytest.mark.parametrize("overrides", [
+        '{"create_ordr": {"rate": 20}}',
+        '{"create_order": {"rate": 0}}',
+        '{"create_order": {"rate": "fast"}}',
+        '{"create_order": {"burts": 5}}',
+        '{"create_order": 20}',
+        '[]',
+    ])
+    def test_invalid_override_fails_at_startup(self, overrides):
+        """Test typos and bad values are rejected instead of failing on the first request"""
+        with pytest.raises(ValueError):
+            server.load_rate_limits(overrides)
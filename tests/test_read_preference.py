@@ -0,0 +1,84 @@
+"""
+Herbalife E-commerce Tests - Catalog read-preference routing
+Runs against a local three-node replica set from MONGO_URL, e.g.
+`mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0`.
+"""
+import asyncio
+import os
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.write_concern import WriteConcern
+
+import server
+
+
+class FindRecorder(monitoring.CommandListener):
+    """Remembers which server answered each find"""
+
+    def __init__(self):
+        self.finds = []
+
+    def started(self, event):
+        if event.command_name == "find":
+            self.finds.append(event.connection_id)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@pytest.fixture
+def replica_set(mongo_hello) -> dict:
+    """The hello reply; skips unless MONGO_URL is a three-node replica set"""
+    if 'setName' not in mongo_hello or len(mongo_hello.get('hosts', [])) < 3:
+        pytest.skip("Needs a three-node replica set")
+    return mongo_hello
+
+
+async def find_served_by(monkeypatch, hello: dict, mode: str):
+    """Insert on the primary, read it back through the catalog handle, return (server, primary)"""
+    monkeypatch.setattr(server, "CATALOG_READ_PREFERENCE", mode)
+    recorder = FindRecorder()
+    # Own client: the recorder has to be registered when the client is created
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], serverSelectionTimeoutMS=2000, event_listeners=[recorder])
+    try:
+        name = os.environ['DB_NAME']
+        # Wait for every member so a secondary read sees the document
+        products = client[name].get_collection("products", write_concern=WriteConcern(w=len(hello['hosts'])))
+        product_id = f"TEST_readpref_{uuid.uuid4().hex}"
+        await products.insert_one({"id": product_id, "name": "TEST read preference"})
+        try:
+            catalog = client.get_database(name, read_preference=server.catalog_read_preference())
+            assert await catalog.products.find_one({"id": product_id}) is not None
+        finally:
+            await products.delete_one({"id": product_id})
+        host, port = hello['primary'].rsplit(':', 1)
+        return recorder.finds[-1], (host, int(port))
+    finally:
+        client.close()
+
+
+class TestCatalogReadPreference:
+    """Public catalog reads can be routed to secondaries"""
+
+    def test_unknown_mode_is_rejected(self, monkeypatch):
+        """Test a typo in CATALOG_READ_PREFERENCE fails loudly"""
+        monkeypatch.setattr(server, "CATALOG_READ_PREFERENCE", "secondaryPrefered")
+        with pytest.raises(ValueError):
+            server.catalog_read_preference()
+
+    def test_secondary_preferred_reads_from_secondary(self, monkeypatch, replica_set):
+        """Test catalog reads leave the primary when secondaryPreferred is set"""
+        served_by, primary = asyncio.run(find_served_by(monkeypatch, replica_set, "secondaryPreferred"))
+        assert served_by != primary
+        print(f"Catalog read served by {served_by}, primary is {primary}")
+
+    def test_primary_default_stays_on_primary(self, monkeypatch, replica_set):
+        """Test the default keeps catalog reads on the primary"""
+        served_by, primary = asyncio.run(find_served_by(monkeypatch, replica_set, "primary"))
+        assert served_by == primary